@@ -19,7 +19,7 @@ base = 'Win32GUI'
 
 data_files = ['resources', 'README.md']
 
-build_exe_options = {'packages': ['PyQt5', 'PIL', 'jaae'],
+build_exe_options = {'packages': ['PyQt5', 'PIL', 'numpy', 'jaae'],
                      'includes': ['sip'],
                      'excludes': 'tkinter',
                      'include_files': data_files,
@@ -36,7 +36,7 @@ setup(name='JAAE - Just an Animation Editor',
       author='Kaiser de Emperana',
       url='https://github.com/kaisermg5/jaae',
       options={"build_exe": build_exe_options},
-      requires=['sip', 'PyQt5', 'PIL'],
+      requires=['sip', 'PyQt5', 'PIL', 'numpy'],
       scripts=scripts,
       packages=['jaae'],
       executables=executables
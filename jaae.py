@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 
+import multiprocessing
+
 from jaae.main_window import main
 
-main()
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
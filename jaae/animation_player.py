@@ -0,0 +1,104 @@
+from PyQt5 import QtCore, QtGui
+
+from . import gba_image
+
+
+# The GBA draws 59.7275 frames per second (16.78 MHz / 280896 cycles per frame)
+GBA_FRAME_RATE = 59.7275
+# Milliseconds between two ticks of the player, about one frame of the screen
+TICK_INTERVAL = 16
+
+
+def get_gba_timer(elapsed_ms):
+    """Value of the 16-bit frame counter the animation routine reads"""
+    return int(elapsed_ms * GBA_FRAME_RATE / 1000) & 0xffff
+
+
+def get_frame_index(timer, speed, frame_count):
+    """
+    Frame shown at timer, as the routine in base_routines.s picks it:
+    it changes every 2 ** (speed + 1) frames
+    """
+    return (timer >> (speed + 1)) & (frame_count - 1)
+
+
+class AnimationPlayer(QtCore.QObject):
+    """
+    Plays the animations over the tileset scene with the timing of the game.
+    The animations and frames are read from the handler on every tick, so
+    changing the speed, frame count or frames shows up right away.
+    refresh() has to be called when the tiles of an animation change
+    """
+    def __init__(self, handler, scene, tiles_wide=16):
+        super(AnimationPlayer, self).__init__()
+        self.handler = handler
+        self.scene = scene
+        self.tiles_wide = tiles_wide
+        self.items = []
+        # Frame pixmaps by (frame sheet, start column), for frame_pixmaps_palette
+        self.frame_pixmaps = {}
+        self.frame_pixmaps_palette = None
+
+        self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(TICK_INTERVAL)
+        self.timer.timeout.connect(self.tick)
+        self.clock = QtCore.QElapsedTimer()
+
+    def is_playing(self):
+        return self.timer.isActive()
+
+    def start(self):
+        self.clock.start()
+        self.timer.start()
+        self.refresh()
+
+    def stop(self):
+        self.timer.stop()
+        self.scene.clear_animated_tiles()
+        self.items = []
+        self.frame_pixmaps = {}
+
+    def refresh(self):
+        """Places an item over the tiles of every animation"""
+        if not self.is_playing():
+            return
+        self.scene.clear_animated_tiles()
+        self.items = [
+            (animation, self.scene.add_animated_tiles(animation.start_tile, animation.end_tile))
+            for animation in self.handler.get_animations()
+        ]
+        self.tick()
+
+    def get_frame_pixmap(self, sheet, start_tile, palette):
+        """
+        Pixmap of the frame laid out like the tileset, starting at the column
+        of start_tile, so it can be drawn from the left of its first row
+        """
+        if palette != self.frame_pixmaps_palette:
+            self.frame_pixmaps = {}
+            self.frame_pixmaps_palette = palette
+        column = start_tile % self.tiles_wide
+        key = (sheet, column)
+        pixmap = self.frame_pixmaps.get(key)
+        if pixmap is None:
+            padded = gba_image.TileSheet(bytes(column * 32) + bytes(sheet))
+            indices = padded.get_indices(self.tiles_wide)
+            h, w = indices.shape
+            image = QtGui.QImage(indices.tobytes(), w, h, w, QtGui.QImage.Format_Indexed8)
+            image.setColorTable(gba_image.get_palette_lut(palette, 'ARGB32').tolist())
+            # fromImage copies the pixels, so the buffer doesn't need to outlive it
+            pixmap = QtGui.QPixmap.fromImage(image)
+            self.frame_pixmaps[key] = pixmap
+        return pixmap
+
+    def tick(self):
+        timer = get_gba_timer(self.clock.elapsed())
+        palette = self.handler.get_palette()
+        for animation, item in self.items:
+            index = get_frame_index(timer, animation.speed, animation.get_frame_count())
+            sheet = self.handler.get_frame_sheet(animation.frames[index])
+            if sheet is None:
+                item.set_pixmap(None)
+            else:
+                item.set_pixmap(self.get_frame_pixmap(sheet, animation.start_tile, palette))
@@ -0,0 +1,164 @@
+"""
+The routine JAAE inserts in the ROM, built without an assembler: the code of
+resources/base_routines.s, assembled once, with its literal pool filled in for
+the game and insertion offset, followed by the tables of the animations
+laid out like tmp_animation_table.inc would have them
+"""
+
+import struct
+
+# resources/base_routines.s up to the animation table, with the words of the
+# literal pools left as zero
+ROUTINE_CODE = bytes.fromhex(
+    # prepareTilesetCB
+    '0549 0020 0880 0549 0120 c003 0880 0449 0448 0860 7047 0000'
+    '00000000 00000000 00000000 00000000'
+    # animationCB
+    '70b5 041c 124d 134e'
+    # loop
+    '2979 4a09 521c 0120 9040 401e 2040 0028 14d1'
+    'c906 c90e 201c d040 0840 2968 8000 4018 0068'
+    '6968 0903 090d 4901 094a 8918'
+    '6a68 120d 5201 064b 00f0 04f8'
+    # continue
+    '0835 b542 ded3 70bd'
+    # bx_r3
+    '1847 0000'
+    '00000000 00000000 00000000'
+    # __VRAM_Tile_0__
+    '00000000'
+)
+ROUTINE_SIZE = len(ROUTINE_CODE)
+ANIM_TABLE_ENTRY_SIZE = 8
+# The fields packed in the second word of an anim_table_entry, with their
+# width in bits, from the lowest ones
+ANIM_TABLE_ENTRY_FIELDS = (
+    ('frame count mask', 5),
+    ('speed', 3),
+    ('first tile', 12),
+    ('tile count', 12)
+)
+# Where the words of the literal pools go, and the symbol each one holds
+LITERALS = (
+    (0x18, 'TilesetCBCounter'),
+    (0x1c, 'TilesetCBBufferSize'),
+    (0x20, 'TilesetCB'),
+    (0x24, 'animationCB'),
+    (0x78, 'AnimHeaderTable'),
+    (0x7c, 'AnimHeaderTableEnd'),
+    (0x80, 'AppendTilesetAnimToBuffer'),
+    (0x84, 'VRAM_Tile_0')
+)
+ANIMATION_CB_OFFSET = 0x28
+
+# resources/rom_offsets.inc
+APPEND_TILESET_ANIM_TO_BUFFER = {
+    'BPEE': 0x080a0980,
+    'BPRE': 0x0806ff04,
+    'AXVE': 0x08072e24
+}
+# TilesetCB, TilesetCBCounter and TilesetCBBufferSize of the primary and the secondary tileset
+TILESET_CB_VARIABLES = {
+    'BPEE': ((0x03000f40, 0x03000f36, 0x03000f38), (0x03000f44, 0x03000f3a, 0x03000f3c)),
+    'BPRE': ((0x03000fb8, 0x03000fae, 0x03000fb0), (0x03000fbc, 0x03000fb2, 0x03000fb4)),
+    'AXVE': ((0x030006cc, 0x030006c2, 0x030006c4), (0x030006d0, 0x030006c6, 0x030006c8))
+}
+VRAM_TILE_0 = {
+    'BPEE': (0x06000000, 0x06004000),
+    'BPRE': (0x06000000, 0x06005000),
+    'AXVE': (0x06000000, 0x06004000)
+}
+
+
+class InvalidAnimation(Exception):
+    pass
+
+
+def get_anim_table_entry_fields(animation):
+    """The values of ANIM_TABLE_ENTRY_FIELDS for the animation"""
+    return (
+        len(animation.frames) - 1,
+        animation.speed,
+        animation.start_tile,
+        animation.end_tile - animation.start_tile + 1
+    )
+
+
+def check_anim_table_entry_fields(values):
+    for (name, bits), value in zip(ANIM_TABLE_ENTRY_FIELDS, values):
+        if not 0 <= value < 1 << bits:
+            raise InvalidAnimation('The {0} is {1}, it has to be between 0 and {2}.'.format(
+                name, value, (1 << bits) - 1
+            ))
+
+
+def get_rom_symbols(rom_code, is_primary):
+    tileset_cb, counter, buffer_size = TILESET_CB_VARIABLES[rom_code][not is_primary]
+    return {
+        'TilesetCB': tileset_cb,
+        'TilesetCBCounter': counter,
+        'TilesetCBBufferSize': buffer_size,
+        'AppendTilesetAnimToBuffer': APPEND_TILESET_ANIM_TO_BUFFER[rom_code] | 1,
+        'VRAM_Tile_0': VRAM_TILE_0[rom_code][not is_primary]
+    }
+
+
+def pack_anim_table_entry(frame_table, tile_num, tile_count, speed, frame_count_mask):
+    """The anim_table_entry macro. Raises InvalidAnimation if a field doesn't fit"""
+    check_anim_table_entry_fields((frame_count_mask, speed, tile_num, tile_count))
+    return struct.pack(
+        '<II', frame_table,
+        frame_count_mask | (speed << 5) | (tile_num << 8) | (tile_count << 20)
+    )
+
+
+def get_routine_size(animations, frames):
+    size = ROUTINE_SIZE + len(animations) * ANIM_TABLE_ENTRY_SIZE
+    for animation in animations:
+        size += 4 * len(animation.frames)
+    for label in frames:
+        size += len(frames[label])
+    return size
+
+
+def build_routine(animations, frames, rom_code, is_primary, offset):
+    """
+    Returns the routine, to be inserted at offset, with the header table of
+    the animations, their tables of frame pointers and the frames.
+    Every frame of the animations has to be a label of frames. Raises
+    InvalidAnimation if an animation doesn't fit in its table entry
+    """
+    insertion_offset = 0x8000000 | offset
+    table_offset = ROUTINE_SIZE
+    frame_tables_offset = table_offset + len(animations) * ANIM_TABLE_ENTRY_SIZE
+    frames_offset = frame_tables_offset + sum(4 * len(animation.frames) for animation in animations)
+
+    frame_offsets = {}
+    for label in frames:
+        frame_offsets[label] = frames_offset
+        frames_offset += len(frames[label])
+
+    symbols = get_rom_symbols(rom_code, is_primary)
+    symbols['animationCB'] = (insertion_offset + ANIMATION_CB_OFFSET) | 1
+    symbols['AnimHeaderTable'] = insertion_offset + table_offset
+    symbols['AnimHeaderTableEnd'] = insertion_offset + frame_tables_offset
+
+    routine = bytearray(ROUTINE_CODE)
+    for position, symbol in LITERALS:
+        struct.pack_into('<I', routine, position, symbols[symbol])
+
+    frame_tables = bytearray()
+    for animation in animations:
+        routine += pack_anim_table_entry(
+            insertion_offset + frame_tables_offset + len(frame_tables),
+            animation.start_tile,
+            animation.end_tile - animation.start_tile + 1,
+            animation.speed,
+            len(animation.frames) - 1
+        )
+        for label in animation.frames:
+            frame_tables += struct.pack('<I', insertion_offset + frame_offsets[label])
+    routine += frame_tables
+    for label in frames:
+        routine += bytes(frames[label])
+    return bytes(routine)
@@ -0,0 +1,67 @@
+import os
+import hashlib
+
+
+class BuildCache:
+    """
+    Binaries built by the assembler, kept in a directory as one file per
+    build, named by the hash of everything the build depends on. When the
+    files take more than max_bytes the least recently used are deleted
+    """
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def get_key(*parts):
+        """Hashes parts, which are bytes or strings"""
+        h = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            # The length keeps ('ab', 'c') and ('a', 'bc') apart
+            h.update(len(part).to_bytes(8, 'little'))
+            h.update(part)
+        return h.hexdigest()
+
+    def get_filename(self, key):
+        return os.path.join(self.path, key + '.bin')
+
+    def get(self, key):
+        """Returns the binary built for key, or None"""
+        filename = self.get_filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            # The modification time says when it was last used
+            os.utime(filename)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            filename = self.get_filename(key)
+            # Written aside first, a build is never seen half written
+            tmp_filename = filename + '.tmp'
+            with open(tmp_filename, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_filename, filename)
+            self.evict()
+        except OSError:
+            # The cache only saves time, builds work without it
+            pass
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.bin') and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(filename)
+            total -= size
@@ -0,0 +1,73 @@
+import math
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore, QtGui
+
+from . import gba_image
+
+
+THUMBNAIL_SIZE = 32
+MAX_CACHED_THUMBNAILS = 1024
+
+
+def get_thumbnail_key(sheet, palette):
+    """Thumbnails are kept by the hash of the frame data and the raw GBA palette"""
+    return hashlib.blake2b(sheet.data, digest_size=16).digest(), bytes(palette)
+
+
+def make_thumbnail(sheet, color_table):
+    """
+    Draws the frame as square as possible and fits it in a THUMBNAIL_SIZE
+    square. Only touches data of its own, so it can run in any thread
+    """
+    tiles_wide = max(1, math.ceil(math.sqrt(sheet.get_tile_count())))
+    # Not sheet.get_indices, its cache belongs to the GUI thread
+    indices = gba_image.from_4bpp_to_indices(sheet.data, tiles_wide)
+    h, w = indices.shape
+    image = QtGui.QImage(indices.data, w, h, w, QtGui.QImage.Format_Indexed8)
+    image.setColorTable(color_table)
+    # Converting copies the pixels out of indices
+    return image.convertToFormat(QtGui.QImage.Format_ARGB32).scaled(
+        THUMBNAIL_SIZE, THUMBNAIL_SIZE, QtCore.Qt.KeepAspectRatio
+    )
+
+
+class FrameThumbnailer(QtCore.QObject):
+    """
+    Makes the thumbnails of the frames in a worker thread and caches them as
+    icons. thumbnail_ready is emitted in the GUI thread once one is cached
+    """
+    thumbnail_ready = QtCore.pyqtSignal(object)
+    # Emitted by the worker thread, Qt queues it to the GUI thread
+    _thumbnail_made = QtCore.pyqtSignal(object, object)
+
+    def __init__(self):
+        super(FrameThumbnailer, self).__init__()
+        self.thumbnails = {}
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self._thumbnail_made.connect(self.store_thumbnail)
+
+    def get_thumbnail(self, key):
+        return self.thumbnails.get(key)
+
+    def request_thumbnail(self, key, sheet, palette):
+        if key in self.thumbnails or key in self.pending:
+            return
+        self.pending.add(key)
+        color_table = gba_image.get_palette_lut(palette, 'ARGB32').tolist()
+        self.executor.submit(self.make_thumbnail, key, sheet, color_table)
+
+    def make_thumbnail(self, key, sheet, color_table):
+        self._thumbnail_made.emit(key, make_thumbnail(sheet, color_table))
+
+    def store_thumbnail(self, key, image):
+        self.pending.discard(key)
+        if len(self.thumbnails) >= MAX_CACHED_THUMBNAILS:
+            self.thumbnails.clear()
+        self.thumbnails[key] = QtGui.QIcon(QtGui.QPixmap.fromImage(image))
+        self.thumbnail_ready.emit(key)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
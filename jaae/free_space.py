@@ -0,0 +1,114 @@
+import bisect
+
+import numpy
+
+# Runs shorter than this aren't worth keeping in the index
+MIN_BLOCK_SIZE = 0x100
+# The ROM is scanned in chunks of this size, so the scan never allocates
+# much more than a chunk's worth of arrays
+SCAN_CHUNK_SIZE = 4 * 1024 * 1024
+# The fill bytes right after data can belong to it, like a table or a sound
+# sample that ends in them, so an insertion is kept this far from the start
+# of a block. A block at the start of the ROM has nothing before it
+FREE_SPACE_MARGIN = 0x10
+
+
+def find_free_blocks(data, fill=0xff, min_size=MIN_BLOCK_SIZE):
+    """
+    Returns the runs of the fill byte in data that are at least min_size
+    long, as sorted (start, end) pairs
+    """
+    blocks = []
+    run_start = None
+    for chunk_start in range(0, len(data), SCAN_CHUNK_SIZE):
+        chunk = numpy.frombuffer(data[chunk_start:chunk_start + SCAN_CHUNK_SIZE], dtype=numpy.uint8)
+        free = (chunk == fill).view(numpy.int8)
+        # 1 where a run starts and -1 where one ends, counting the run that
+        # comes from the previous chunk
+        edges = numpy.diff(free, prepend=numpy.int8(run_start is not None))
+        starts = numpy.flatnonzero(edges == 1) + chunk_start
+        ends = numpy.flatnonzero(edges == -1) + chunk_start
+
+        if run_start is not None:
+            if len(ends) == 0:
+                continue
+            if ends[0] - run_start >= min_size:
+                blocks.append((run_start, int(ends[0])))
+            ends = ends[1:]
+        if len(starts) > len(ends):
+            run_start = int(starts[-1])
+            starts = starts[:-1]
+        else:
+            run_start = None
+        long_enough = ends - starts >= min_size
+        blocks.extend(zip(starts[long_enough].tolist(), ends[long_enough].tolist()))
+
+    if run_start is not None and len(data) - run_start >= min_size:
+        blocks.append((run_start, len(data)))
+    return blocks
+
+
+def align(offset, alignment):
+    return -(-offset // alignment) * alignment
+
+
+class FreeSpaceIndex:
+    """
+    The free blocks of a ROM, sorted by offset and by size. Space taken by
+    an insertion is removed with allocate(), so the ROM doesn't need to be
+    scanned again
+    """
+    def __init__(self, blocks, min_size=MIN_BLOCK_SIZE):
+        self.min_size = min_size
+        self.blocks = sorted(blocks)
+        self.blocks_by_size = sorted((end - start, start) for start, end in self.blocks)
+
+    @classmethod
+    def scan(cls, data, fill=0xff, min_size=MIN_BLOCK_SIZE):
+        return cls(find_free_blocks(data, fill, min_size), min_size)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def copy(self):
+        return FreeSpaceIndex(self.blocks, self.min_size)
+
+    def get_free_bytes(self):
+        return sum(size for size, _ in self.blocks_by_size)
+
+    def find_best_fit(self, size, alignment=4):
+        """
+        Returns the aligned offset in the smallest block that has room for
+        size bytes after FREE_SPACE_MARGIN, or None if none has
+        """
+        i = bisect.bisect_left(self.blocks_by_size, (size, -1))
+        for block_size, start in self.blocks_by_size[i:]:
+            offset = align(start + FREE_SPACE_MARGIN if start > 0 else start, alignment)
+            if offset + size <= start + block_size:
+                return offset
+        return None
+
+    def remove_block(self, i):
+        start, end = self.blocks.pop(i)
+        del self.blocks_by_size[bisect.bisect_left(self.blocks_by_size, (end - start, start))]
+
+    def add_block(self, start, end):
+        if end - start >= self.min_size:
+            bisect.insort(self.blocks, (start, end))
+            bisect.insort(self.blocks_by_size, (end - start, start))
+
+    def allocate(self, offset, size):
+        """Removes the bytes from offset to offset + size from the free blocks"""
+        end = offset + size
+        # The blocks that overlap the range: the one it starts in, and the following ones
+        i = max(bisect.bisect_right(self.blocks, (offset, float('inf'))) - 1, 0)
+        while i < len(self.blocks) and self.blocks[i][0] < end:
+            block_start, block_end = self.blocks[i]
+            if block_end <= offset:
+                i += 1
+                continue
+            self.remove_block(i)
+            # What is left of it on each side
+            self.add_block(block_start, min(offset, block_end))
+            self.add_block(max(end, block_start), block_end)
+            i = bisect.bisect_left(self.blocks, (block_end, 0))
@@ -1,5 +1,7 @@
 
 import math
+
+import numpy
 from PIL import Image
 
 GRAY_SCALE_PALETTE = [(_ // 3) * 16 for _ in range(16*3)]
@@ -30,20 +32,13 @@ def format_palette(palette, colors=16):
 
 def from_img_to_4bpp(img):
     validate_gbaimage(img)
-    data = b''
-    imgdata = img.getdata()
     w, h = img.size
-    tiles_h, tiles_w = h // 8, w // 8
-    for tile in range(tiles_h * tiles_w):
-        tile_data = b''
-        index = 8 * (tile % tiles_w) + w * 8 * (tile // tiles_w)
-        for j in range(8):
-            for i in range(4):
-                n = (imgdata[index + 2*i + j*w] & 0xf) | ((imgdata[index + 2*i + j*w + 1] & 0xf) << 4)
-                tile_data += n.to_bytes(1, 'little')
-
-        data += tile_data
-    return data
+    pixels = numpy.asarray(img, dtype=numpy.uint8) & 0xf
+    # (pixel_y, pixel_x) -> (tile_y, tile_x, pixel_y_in_tile, pixel_x_in_tile)
+    tiles = pixels.reshape(h // 8, 8, w // 8, 8).transpose(0, 2, 1, 3)
+    # The pixel on the left goes in the low nibble
+    data = tiles[..., 0::2] | (tiles[..., 1::2] << 4)
+    return data.tobytes()
 
 
 def img_palette_to_gba(img):
@@ -56,52 +51,162 @@ def palette_to_gba(palette):
 
 
 def pal_to_gba(palette):
-    data = b''
-    for color in palette:
-        r, g, b = color
-        r >>= 3
-        g >>= 3
-        b >>= 3
-        data += (r | (g << 5) | (b << 10)).to_bytes(2, 'little')
-    return data
-
-
-def from_gba_to_pal(data):
-    pal_list = []
+    colors = numpy.array(palette, dtype=numpy.uint16).reshape(-1, 3) >> 3
+    data = colors[:, 0] | (colors[:, 1] << 5) | (colors[:, 2] << 10)
+    return data.astype('<u2').tobytes()
 
-    for i in range(len(data) // 2):
-        n = int.from_bytes(data[i * 2:(i + 1) * 2], 'little')
-        r = (n & 0x1f) << 3
-        g = (n & 0x3e0) >> 2
-        b = (n & 0x7c00) >> 7
-        pal_list.extend((r, g, b))
 
-    return pal_list
+def from_gba_to_palettes(data):
+    """
+    Decodes any number of consecutive 16-color GBA palettes in one pass.
+    Returns an array shaped (palettes, 16, 3)
+    """
+    n = numpy.frombuffer(data, dtype='<u2', count=len(data) // 32 * 16)
+    colors = numpy.empty((len(n), 3), dtype=numpy.uint8)
+    colors[:, 0] = (n & 0x1f) << 3
+    colors[:, 1] = (n & 0x3e0) >> 2
+    colors[:, 2] = (n & 0x7c00) >> 7
+    return colors.reshape(-1, 16, 3)
 
 
-def from_4bpp_to_img(gbadata, tiles_wide):
+def from_gba_to_pal(data):
+    n = numpy.frombuffer(data, dtype='<u2', count=len(data) // 2)
+    colors = numpy.empty((len(n), 3), dtype=numpy.uint8)
+    colors[:, 0] = (n & 0x1f) << 3
+    colors[:, 1] = (n & 0x3e0) >> 2
+    colors[:, 2] = (n & 0x7c00) >> 7
+    return colors.ravel().tolist()
+
+
+# Lookup tables of the palettes, by (raw GBA palette, mode)
+_palette_luts = {}
+MAX_CACHED_LUTS = 1024
+LUT_MODES = ('RGB', 'RGBA', 'ARGB32')
+
+
+def _make_lut(colors, mode):
+    if mode == 'RGB':
+        lut = numpy.array(colors, dtype=numpy.uint8)
+    elif mode == 'RGBA':
+        lut = numpy.full((16, 4), 255, dtype=numpy.uint8)
+        lut[:, :3] = colors
+    else:
+        # One 0xAARRGGBB integer per color, as Qt's ARGB32 images use
+        colors = numpy.asarray(colors, dtype=numpy.uint32)
+        lut = 0xff000000 | (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+    lut.flags.writeable = False
+    return lut
+
+
+def _cache_lut(key, lut):
+    if len(_palette_luts) >= MAX_CACHED_LUTS:
+        _palette_luts.clear()
+    _palette_luts[key] = lut
+
+
+def get_palette_lut(gba_palette, mode='RGB'):
+    """
+    Returns a read-only lookup table from color index to color for the raw
+    32-byte GBA palette. mode is one of LUT_MODES: 'RGB' and 'RGBA' give one
+    row of bytes per color, 'ARGB32' one 32-bit integer per color
+    """
+    if mode not in LUT_MODES:
+        raise ValueError('Unknown palette mode "{0}".'.format(mode))
+    key = (bytes(gba_palette), mode)
+    lut = _palette_luts.get(key)
+    if lut is None:
+        lut = _make_lut(from_gba_to_palettes(key[0])[0], mode)
+        _cache_lut(key, lut)
+    return lut
+
+
+def split_gba_palettes(data):
+    """
+    Splits consecutive GBA palettes in a list of raw 32-byte palettes.
+    All of them are decoded at once, and their RGB lookup tables cached
+    """
+    palettes = []
+    for i, colors in enumerate(from_gba_to_palettes(data)):
+        gba_palette = bytes(data[i * 32:(i + 1) * 32])
+        if (gba_palette, 'RGB') not in _palette_luts:
+            _cache_lut((gba_palette, 'RGB'), _make_lut(colors, 'RGB'))
+        palettes.append(gba_palette)
+    return palettes
+
+
+def from_4bpp_to_indices(gbadata, tiles_wide):
+    """
+    Returns an array with the palette index of every pixel, shaped (height, width)
+    """
     total_tiles = len(gbadata) // 32
     tiles_high = math.ceil(total_tiles / tiles_wide)
 
-    img_data = [0] * (64 * tiles_wide * tiles_high)
+    # Pad the data up to a whole number of tile rows
+    packed = numpy.zeros(32 * tiles_wide * tiles_high, dtype=numpy.uint8)
+    data = numpy.frombuffer(gbadata, dtype=numpy.uint8)[:len(packed)]
+    packed[:len(data)] = data
 
-    for i in range(len(gbadata)):
-        pixel_pair = gbadata[i]
-        pixel_1 = pixel_pair & 0xf
-        pixel_2 = pixel_pair >> 4
+    # Each byte has two pixels, the low nibble being the one on the left
+    pixels = numpy.empty((len(packed), 2), dtype=numpy.uint8)
+    pixels[:, 0] = packed & 0xf
+    pixels[:, 1] = packed >> 4
 
-        tile_x = (i >> 5) % tiles_wide
-        tile_y = (i >> 5) // tiles_wide
-        pixel_x_in_tile = i & 0x3
-        pixel_y_in_tile = (i & 0x1f) >> 2
-        pixel_pair_index = (64 * tiles_wide * tile_y) + (8 * tiles_wide * pixel_y_in_tile) + \
-                           (8 * tile_x) + pixel_x_in_tile * 2
+    # (tile_y, tile_x, pixel_y, pixel_x) -> (tile_y, pixel_y, tile_x, pixel_x)
+    pixels = pixels.reshape(tiles_high, tiles_wide, 8, 8).transpose(0, 2, 1, 3)
+    return numpy.ascontiguousarray(pixels).reshape(tiles_high * 8, tiles_wide * 8)
 
-        img_data[pixel_pair_index] = pixel_1
-        img_data[pixel_pair_index + 1] = pixel_2
 
-    img = Image.new('P', (tiles_wide * 8, tiles_high * 8))
-    img.putdata(img_data)
-    img.putpalette(GRAY_SCALE_PALETTE)
+def indices_to_img(indices, palette=GRAY_SCALE_PALETTE):
+    h, w = indices.shape
+    img = Image.frombuffer('P', (w, h), indices, 'raw', 'P', 0, 1)
+    img.putpalette(palette)
     return img
 
+
+def from_4bpp_to_img(gbadata, tiles_wide):
+    return indices_to_img(from_4bpp_to_indices(gbadata, tiles_wide))
+
+
+class TileSheet:
+    """
+    4bpp tile data, as read from the ROM or a JAAE file.
+    The data is never modified, so the index-per-pixel view of it is only
+    computed the first time it's needed (for each width in tiles)
+    """
+    __slots__ = ('data', '_indices', '_indices_tiles_wide')
+
+    def __init__(self, data=b''):
+        if not isinstance(data, memoryview) or not data.readonly:
+            data = memoryview(bytes(data))
+        self.data = data
+        self._indices = None
+        self._indices_tiles_wide = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bytes__(self):
+        return self.data.tobytes()
+
+    def get_tile_count(self):
+        return len(self.data) // 32
+
+    def split(self, parts):
+        """
+        Splits the sheet in parts of the same size, without copying the data
+        """
+        part_size = len(self.data) // parts
+        return [TileSheet(self.data[i * part_size:(i + 1) * part_size]) for i in range(parts)]
+
+    def get_indices(self, tiles_wide):
+        if self._indices_tiles_wide != tiles_wide:
+            self._indices = from_4bpp_to_indices(self.data, tiles_wide)
+            self._indices.flags.writeable = False
+            self._indices_tiles_wide = tiles_wide
+        return self._indices
+
+    def get_image(self, tiles_wide, palette=GRAY_SCALE_PALETTE):
+        """
+        Returns an indexed image that shares its pixels with the cached indices
+        """
+        return indices_to_img(self.get_indices(tiles_wide), palette)
@@ -1,4 +1,6 @@
 
+import os
+
 from PyQt5 import QtWidgets, QtGui
 
 from .jaae_handler import JaaeError
@@ -7,6 +9,10 @@ from .insert_to_rom_ui import Ui_InsertToRomDialog
 
 
 class InsertToRomDialog(QtWidgets.QDialog):
+    # Free space byte of each item of fill_cmb
+    FILL_BYTES = (0xff, 0x00)
+    PATCH_FILE_TYPES = (('UPS patch (*.ups)', '.ups'), ('IPS patch (*.ips)', '.ips'))
+
     def __init__(self, handler):
         QtWidgets.QDialog.__init__(self)
         self.ui = Ui_InsertToRomDialog()
@@ -20,26 +26,45 @@ class InsertToRomDialog(QtWidgets.QDialog):
         self.ui.free_space_txt.returnPressed.connect(self.insert_to_rom)
         self.ui.insert_btn.setEnabled(False)
         self.ui.insert_btn.clicked.connect(self.insert_to_rom)
+        self.ui.patch_btn.setEnabled(False)
+        self.ui.patch_btn.clicked.connect(self.save_patch)
+        self.ui.find_space_btn.clicked.connect(self.find_free_space)
         self.ui.needed_bytes_label.setText(str(self.handler.get_needed_space()))
 
     def error_message(self, description):
         QtWidgets.QMessageBox.critical(self, 'Error', description)
 
-    def insert_to_rom(self):
+    def find_free_space(self):
+        try:
+            offset = self.handler.find_free_space(fill=self.FILL_BYTES[self.ui.fill_cmb.currentIndex()])
+        except JaaeError as e:
+            self.error_message(str(e))
+            return
+        if offset is None:
+            self.error_message("There isn't enough free space for the animations.")
+        else:
+            self.ui.free_space_txt.setText(hex(offset))
+
+    def get_offset(self):
         txt = self.ui.free_space_txt.text()
         if txt:
             try:
-                offset = int(txt, base=0)
+                return int(txt, base=0)
             except ValueError:
                 self.error_message('Invalid number.')
-                return
+        return None
 
+    def insert_to_rom(self):
+        offset = self.get_offset()
+        if offset is not None:
             if main_window.MainWindow.yes_no_question(
                 'Inset to ROM',
                 'Are you sure you want to insert the animations to the rom?'
             ):
                 try:
-                    output, result = self.handler.insert_to_rom(offset)
+                    output, result = self.handler.insert_to_rom(
+                        offset, self.ui.devkitarm_chk.isChecked()
+                    )
                 except JaaeError as e:
                     self.error_message(str(e))
                     return
@@ -51,6 +76,33 @@ class InsertToRomDialog(QtWidgets.QDialog):
                 )[result]
                 QtWidgets.QMessageBox.information(self, title, description, QtWidgets.QMessageBox.Ok)
 
+    def save_patch(self):
+        offset = self.get_offset()
+        if offset is not None:
+            filename, file_type = QtWidgets.QFileDialog.getSaveFileName(
+                self, 'Save Patch',
+                self.handler.get_filedialog_path(),
+                ';;'.join(name for name, _ in self.PATCH_FILE_TYPES)
+            )
+            if filename:
+                if not os.path.splitext(filename)[1]:
+                    filename += dict(self.PATCH_FILE_TYPES).get(file_type, '.ups')
+                try:
+                    output, result = self.handler.insert_to_rom(
+                        offset, self.ui.devkitarm_chk.isChecked(), filename
+                    )
+                except JaaeError as e:
+                    self.error_message(str(e))
+                    return
+                self.ui.output_txt.setText(output)
+
+                title, description = (
+                    ('Patch failed', 'Failed to make the patch'),
+                    ('Patch saved', 'The patch was saved successfully')
+                )[result]
+                QtWidgets.QMessageBox.information(self, title, description, QtWidgets.QMessageBox.Ok)
+
     def free_space_txt_changed(self):
         self.ui.insert_btn.setEnabled(self.ui.free_space_txt.text() != '')
+        self.ui.patch_btn.setEnabled(self.ui.free_space_txt.text() != '')
 
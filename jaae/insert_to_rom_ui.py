@@ -36,15 +36,29 @@ class Ui_InsertToRomDialog(object):
         self.free_space_txt.setSizePolicy(sizePolicy)
         self.free_space_txt.setObjectName("free_space_txt")
         self.gridLayout_2.addWidget(self.free_space_txt, 1, 1, 1, 1)
+        self.fill_cmb = QtWidgets.QComboBox(self.groupBox)
+        self.fill_cmb.setObjectName("fill_cmb")
+        self.fill_cmb.addItem("")
+        self.fill_cmb.addItem("")
+        self.gridLayout_2.addWidget(self.fill_cmb, 2, 0, 1, 1)
+        self.find_space_btn = QtWidgets.QPushButton(self.groupBox)
+        self.find_space_btn.setObjectName("find_space_btn")
+        self.gridLayout_2.addWidget(self.find_space_btn, 2, 1, 1, 1)
+        self.patch_btn = QtWidgets.QPushButton(self.groupBox)
+        self.patch_btn.setObjectName("patch_btn")
+        self.gridLayout_2.addWidget(self.patch_btn, 3, 0, 1, 1)
         self.insert_btn = QtWidgets.QPushButton(self.groupBox)
         self.insert_btn.setObjectName("insert_btn")
-        self.gridLayout_2.addWidget(self.insert_btn, 2, 1, 1, 1)
+        self.gridLayout_2.addWidget(self.insert_btn, 3, 1, 1, 1)
+        self.devkitarm_chk = QtWidgets.QCheckBox(self.groupBox)
+        self.devkitarm_chk.setObjectName("devkitarm_chk")
+        self.gridLayout_2.addWidget(self.devkitarm_chk, 4, 1, 1, 1)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
-        self.gridLayout_2.addItem(spacerItem, 3, 1, 1, 1)
+        self.gridLayout_2.addItem(spacerItem, 5, 1, 1, 1)
         self.output_txt = QtWidgets.QTextEdit(self.groupBox)
         self.output_txt.setReadOnly(True)
         self.output_txt.setObjectName("output_txt")
-        self.gridLayout_2.addWidget(self.output_txt, 0, 2, 4, 1)
+        self.gridLayout_2.addWidget(self.output_txt, 0, 2, 6, 1)
         self.gridLayout.addWidget(self.groupBox, 0, 0, 1, 1)
 
         self.retranslateUi(InsertToRomDialog)
@@ -57,5 +71,13 @@ class Ui_InsertToRomDialog(object):
         self.needed_bytes_label.setText(_translate("InsertToRomDialog", "0"))
         self.label.setText(_translate("InsertToRomDialog", "Free space offset:"))
         self.label_2.setText(_translate("InsertToRomDialog", "Needed bytes:"))
+        self.fill_cmb.setToolTip(_translate("InsertToRomDialog", "Value of the bytes of free space"))
+        self.fill_cmb.setItemText(0, _translate("InsertToRomDialog", "0xFF"))
+        self.fill_cmb.setItemText(1, _translate("InsertToRomDialog", "0x00"))
+        self.find_space_btn.setText(_translate("InsertToRomDialog", "Find free space"))
+        self.patch_btn.setToolTip(_translate("InsertToRomDialog", "Save the insertion as an IPS or UPS patch of the ROM, leaving the ROM as it is"))
+        self.patch_btn.setText(_translate("InsertToRomDialog", "Save as patch..."))
         self.insert_btn.setText(_translate("InsertToRomDialog", "Insert to ROM"))
+        self.devkitarm_chk.setToolTip(_translate("InsertToRomDialog", "Assemble resources/base_routines.s instead of using the built-in routine"))
+        self.devkitarm_chk.setText(_translate("InsertToRomDialog", "Assemble with DevkitARM"))
 
@@ -1,5 +1,6 @@
 
 from .animation import Animation
+from .gba_image import TileSheet
 
 
 class InvalidJaaeFileFormat(Exception):
@@ -18,16 +19,16 @@ def serialize_frames(frames_dict):
         max_length = max(len(label), max_length)
 
     label_data = b''
-    img_data = b''
+    img_data = []
     for label in frames_dict:
         curr_label_data = (label + ' ' * (max_length - len(label))).encode('utf-8')
         if len(curr_label_data) > max_length:
             raise InvalidJaaeFileFormat('The label contains invalid characters.')
 
         label_data += curr_label_data + len(frames_dict[label]).to_bytes(4, 'little')
-        img_data += frames_dict[label]
+        img_data.append(bytes(frames_dict[label]))
 
-    return label_data + img_data, max_length
+    return label_data + b''.join(img_data), max_length
 
 
 def serialize_animations(animations, label_length, label_list):
@@ -69,11 +70,12 @@ def save_file(filename, animations, frames_dict):
 
 def deserialize_frames(data, frames_count, label_length, offset):
     data_offset = offset + frames_count * (label_length + 4)
+    data_view = memoryview(data)
     frames_dict = {}
     for i in range(frames_count):
         label = data[offset:offset + label_length].decode('utf-8').strip()
         data_size = int.from_bytes(data[offset + label_length:offset + label_length + 4], 'little')
-        frames_dict[label] = data[data_offset:data_offset + data_size]
+        frames_dict[label] = TileSheet(data_view[data_offset:data_offset + data_size])
         offset += label_length + 4
         data_offset += data_size
 
@@ -1,10 +1,14 @@
 
 import os
 import sys
+import mmap
 import math
 import re
 import shutil
 import subprocess
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 
 from PIL import Image
@@ -12,6 +16,13 @@ from PIL import Image
 from . import lz77
 from . import gba_image
 from .animation import Animation
+from .map_layout import MapLayout
+from .rom_image import RomImage
+from .build_cache import BuildCache
+from .free_space import FreeSpaceIndex
+from .rom_patch import ChangeSet, PatchError
+from . import tileset_catalog
+from . import animation_routine
 from . import jaae_fileformat
 
 
@@ -19,11 +30,31 @@ class JaaeError(Exception):
     pass
 
 
-JAAE_BASE_PATH = os.path.dirname(os.path.abspath(sys.argv[0]))
+class InsertionReport:
+    """What insert_batch did with one tileset"""
+    def __init__(self, header_offset):
+        self.header_offset = header_offset
+        self.is_primary = None
+        self.animation_count = 0
+        self.frame_count = 0
+        self.size = 0
+        # Where the routine went, None if it wasn't inserted
+        self.routine_offset = None
+        self.error = None
+
+    def inserted(self):
+        return self.routine_offset is not None and self.error is None
+
+    def __str__(self):
+        if self.inserted():
+            return 'Tileset {0}: {1} animations and {2} frames, {3} bytes at {4}.'.format(
+                hex(self.header_offset), self.animation_count, self.frame_count,
+                self.size, hex(0x8000000 | self.routine_offset)
+            )
+        return 'Tileset {0}: {1}'.format(hex(self.header_offset), self.error)
 
 
-def read_pointer(data):
-    return int.from_bytes(data, 'little') & 0x7ffffff
+JAAE_BASE_PATH = os.path.dirname(os.path.abspath(sys.argv[0]))
 
 
 class JaaeHandler:
@@ -32,8 +63,23 @@ class JaaeHandler:
         'BPRE': 0x2d4a94,
         'AXVE': 0x286cf4
     }
+    # Tiles (and metatiles) and palettes of the primary tileset, the
+    # secondary tileset takes the ones after them
+    PRIMARY_TILES_COUNT = {
+        'BPEE': 512,
+        'BPRE': 640,
+        'AXVE': 512
+    }
+    PRIMARY_PALETTES_COUNT = {
+        'BPEE': 6,
+        'BPRE': 7,
+        'AXVE': 6
+    }
+    MAX_MAP_SIDE = 0x400
+    # Decoded tilesets are kept up to this many bytes, counting their data
+    # and its indices, which take two bytes per byte of data
+    MAX_CACHED_TILESETS_BYTES = 32 * 1024 * 1024
 
-    ROUTINE_SIZE = 0x84
     AS = 'arm-none-eabi-as'
     TMP_SRC = os.path.join(JAAE_BASE_PATH, 'tmp_animation_table.inc')
     TMP_OBJECT = os.path.join(JAAE_BASE_PATH, 'tmp.o')
@@ -41,21 +87,38 @@ class JaaeHandler:
     OBJCOPY = 'arm-none-eabi-objcopy'
     AS_OPTIONS = ('-mthumb', 'resources/base_routines.s', '-o', TMP_OBJECT)
     OBJCOPY_OPTIONS = ('-O', 'binary', TMP_OBJECT, TMP_BIN)
+    # What the assembled routine depends on besides the animations
+    ROUTINE_SOURCES = ('resources/base_routines.s', 'resources/rom_offsets.inc')
+    BUILD_CACHE_PATH = os.path.join(JAAE_BASE_PATH, 'build_cache')
+    MAX_BUILD_CACHE_BYTES = 64 * 1024 * 1024
 
     def __init__(self, user_interface_obj=None):
         self.user_interface_obj = user_interface_obj
         self.rom_filename = None
+        self.rom = None
         self.rom_code = None
         self.tileset_header_offset = None
         self.is_primary_tileset = None
         self.tileset_palettes = [None] * 16
-        self.tileset_img = None
+        self.tileset = None
         self.selected_palette = 0
         self.working_animation = None
         self.animations = []
         self.working_frame = None
         self.frames = {}
 
+        # Decoded tilesets by (ROM identity, header offset), filled by the
+        # loads and by a thread that decodes the neighbours of the loaded one
+        self.tileset_cache = collections.OrderedDict()
+        self.tileset_cache_bytes = 0
+        self.tileset_cache_lock = threading.Lock()
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        # Builds the tileset catalog away from the GUI thread
+        self.catalog_executor = ThreadPoolExecutor(max_workers=1)
+        self.build_cache = BuildCache(self.BUILD_CACHE_PATH, self.MAX_BUILD_CACHE_BYTES)
+        # Free space indexes by fill byte, with the identity of the ROM they were scanned from
+        self.free_space = {}
+
     def get_filedialog_path(self):
         return '.'
 
@@ -65,22 +128,33 @@ class JaaeHandler:
             self.tileset_header_offset = None
             self.is_primary_tileset = None
             self.tileset_palettes = [None] * 16
-            self.tileset_img = None
+            self.tileset = None
+        if self.rom is not None:
+            self.rom.close()
+            self.rom = None
         self.rom_filename = filename
 
     def rom_loaded(self):
         return self.rom_filename is not None
 
     def tileset_loaded(self):
-        return self.tileset_img is not None
+        return self.tileset is not None
+
+    def get_rom(self):
+        """
+        Returns the ROM mapped to memory. It's mapped once, and again only if
+        the file was changed since the last call
+        """
+        if self.rom is None:
+            self.rom = RomImage(self.rom_filename)
+        elif self.rom.refresh():
+            self.rom_code = None
+        return self.rom
 
     def read_rom_code(self, contents=None):
         if contents is None:
-            with open(self.rom_filename, 'rb') as f:
-                f.seek(0xac)
-                rom_code = (f.read(4)).decode('utf-8')
-        else:
-            rom_code = contents[0xac:0xb0].decode('utf-8')
+            contents = self.get_rom()
+        rom_code = bytes(contents[0xac:0xb0]).decode('utf-8')
         if rom_code not in ('BPEE', 'BPRE', 'AXVE'):
             raise JaaeError('Unknown rom code "{0}".'.format(rom_code))
         self.rom_code = rom_code
@@ -90,50 +164,189 @@ class JaaeHandler:
             self.read_rom_code()
         return self.MAIN_TILESETS_HEADER_OFFSETS[self.rom_code] + (tileset_number * 24)
 
-    def load_tileset(self, offset):
-        offset &= 0x7ffffff
-        with open(self.rom_filename, 'rb') as f:
-            contents = f.read()
-        if self.rom_code is None:
-            self.read_rom_code(contents)
-
-        if len(contents) < (offset + 8):
+    def read_tileset(self, contents, offset):
+        """
+        Reads the tileset with the header at offset.
+        Returns its tiles, its palettes and the offset of its metatiles
+        """
+        if len(contents) < (offset + 16):
             raise JaaeError('The header offset "{0}" is too big.'.format(hex(offset)))
 
-        tileset_img_offset = read_pointer(contents[offset + 4:offset + 8])
+        tileset_img_offset = contents.read_pointer(offset + 4)
         if len(contents) <= tileset_img_offset:
             raise JaaeError('The image offset "{0}" is too big.'.format(hex(tileset_img_offset)))
         if contents[offset]:  # tileset is compressed
             try:
-                tileset_data, _ = lz77.decompress(contents[tileset_img_offset::])
+                tileset_data, _ = lz77.decompress(contents[tileset_img_offset:])
             except lz77.InvalidLz77Data:
                 raise JaaeError('Tileset header point to invalid image data.')
         else:
-            tileset_data = contents[tileset_img_offset:tileset_img_offset + 32 * 512]
-
-        self.tileset_img = gba_image.from_4bpp_to_img(tileset_data, 16)
-        self.is_primary_tileset = contents[offset + 1] == 0
+            tileset_data = bytes(contents[tileset_img_offset:tileset_img_offset + 32 * 512])
 
-        tileset_palettes_offset = read_pointer(contents[offset + 8:offset + 12])
+        tileset_palettes_offset = contents.read_pointer(offset + 8)
         if len(contents) < (tileset_palettes_offset + 16 * 32):
             raise JaaeError('The palettes offset "{0}" is too big.'.format(
                 hex(tileset_palettes_offset))
             )
-        for i in range(16):
-            self.tileset_palettes[i] = gba_image.from_gba_to_pal(
-                contents[tileset_palettes_offset:tileset_palettes_offset + 32]
-            )
-            tileset_palettes_offset += 32
+        palettes = gba_image.split_gba_palettes(
+            contents[tileset_palettes_offset:tileset_palettes_offset + 16 * 32]
+        )
+        metatiles_offset = contents.read_pointer(offset + 12)
+        return gba_image.TileSheet(tileset_data), palettes, metatiles_offset
+
+    @staticmethod
+    def get_tileset_size(tileset):
+        tileset_data, _, _ = tileset
+        return len(tileset_data) * 3 + 16 * 32
+
+    def cache_tileset(self, key, tileset):
+        with self.tileset_cache_lock:
+            if key in self.tileset_cache:
+                return
+            self.tileset_cache[key] = tileset
+            self.tileset_cache_bytes += self.get_tileset_size(tileset)
+            while self.tileset_cache_bytes > self.MAX_CACHED_TILESETS_BYTES and \
+                    len(self.tileset_cache) > 1:
+                _, old = self.tileset_cache.popitem(last=False)
+                self.tileset_cache_bytes -= self.get_tileset_size(old)
+
+    def read_cached_tileset(self, contents, offset):
+        """Like read_tileset, but only decodes the tilesets that aren't cached"""
+        key = (contents.get_identity(), offset)
+        with self.tileset_cache_lock:
+            tileset = self.tileset_cache.get(key)
+            if tileset is not None:
+                self.tileset_cache.move_to_end(key)
+                return tileset
+        tileset = self.read_tileset(contents, offset)
+        self.cache_tileset(key, tileset)
+        return tileset
+
+    def prefetch_tileset(self, contents, key, offset):
+        # Runs in the prefetch thread. The ROM can't be mapped again while
+        # it's read, and if it was since the prefetch was asked for, the
+        # tileset is left for the next load
+        with contents.lock:
+            if contents.get_identity() != key[0]:
+                return
+            try:
+                tileset = self.read_tileset(contents, offset)
+            except JaaeError:
+                # There's no tileset there
+                return
+        # The sheet isn't shared yet, so its indices can be made here
+        tileset[0].get_indices(16)
+        self.cache_tileset(key, tileset)
+
+    def prefetch_neighbour_tilesets(self, offset):
+        """
+        If the tileset at offset is in the table of the game, decodes the
+        ones next to it in the background
+        """
+        table_offset = self.MAIN_TILESETS_HEADER_OFFSETS[self.rom_code]
+        if offset < table_offset or (offset - table_offset) % 24 != 0:
+            return
+        contents = self.get_rom()
+        for neighbour in (offset + 24, offset - 24):
+            key = (contents.get_identity(), neighbour)
+            if neighbour >= table_offset and key not in self.tileset_cache:
+                self.prefetch_executor.submit(self.prefetch_tileset, contents, key, neighbour)
+
+    def start_tileset_catalog(self, processes=None):
+        """
+        Starts reading every tileset in the table of the game in another
+        thread. Returns a future of the list of TilesetInfo
+        """
+        if self.rom_code is None:
+            self.read_rom_code()
+        return self.catalog_executor.submit(
+            tileset_catalog.build_catalog,
+            self.rom_filename,
+            self.MAIN_TILESETS_HEADER_OFFSETS[self.rom_code],
+            tileset_catalog.CALLBACK_POINTER_OFFSETS[self.rom_code],
+            processes
+        )
+
+    def build_tileset_catalog(self, processes=None):
+        """Returns a TilesetInfo for every tileset in the table of the game"""
+        return self.start_tileset_catalog(processes).result()
+
+    def load_tileset(self, offset):
+        offset &= 0x7ffffff
+        contents = self.get_rom()
+        if self.rom_code is None:
+            self.read_rom_code(contents)
+
+        self.tileset, self.tileset_palettes, _ = self.read_cached_tileset(contents, offset)
+        self.is_primary_tileset = contents[offset + 1] == 0
         self.selected_palette = 0
         self.tileset_header_offset = offset
+        self.prefetch_neighbour_tilesets(offset)
 
-    def get_tileset_image(self, copy=False):
-        if copy:
-            img = self.tileset_img.copy()
-        else:
-            img = self.tileset_img
-        img.putpalette(self.tileset_palettes[self.selected_palette])
-        return img
+    def load_map_layout(self, offset):
+        """
+        Reads the map layout at offset along with its primary and secondary tilesets
+        """
+        offset &= 0x7ffffff
+        contents = self.get_rom()
+        if self.rom_code is None:
+            self.read_rom_code(contents)
+
+        if len(contents) < (offset + 24):
+            raise JaaeError('The map layout offset "{0}" is too big.'.format(hex(offset)))
+        width = contents.read_u32(offset)
+        height = contents.read_u32(offset + 4)
+        if not (0 < width <= self.MAX_MAP_SIDE and 0 < height <= self.MAX_MAP_SIDE):
+            raise JaaeError('Invalid map layout size {0}x{1}.'.format(width, height))
+        blocks_offset = contents.read_pointer(offset + 12)
+        if len(contents) < (blocks_offset + width * height * 2):
+            raise JaaeError('The map data offset "{0}" is too big.'.format(hex(blocks_offset)))
+        blocks = bytes(contents[blocks_offset:blocks_offset + width * height * 2])
+
+        # The secondary tileset goes after the tiles, palettes and metatiles of the primary one
+        primary_tiles_count = self.PRIMARY_TILES_COUNT[self.rom_code]
+        primary_palettes_count = self.PRIMARY_PALETTES_COUNT[self.rom_code]
+        tiles = b''
+        palettes = []
+        metatiles = b''
+        tileset_offsets = []
+        for i, tiles_count in enumerate((primary_tiles_count, 1024 - primary_tiles_count)):
+            tileset_offset = contents.read_pointer(offset + 16 + i * 4)
+            tileset, tileset_palettes, metatiles_offset = self.read_cached_tileset(
+                contents, tileset_offset
+            )
+            tiles += bytes(tileset)[:tiles_count * 32].ljust(tiles_count * 32, b'\x00')
+            if i == 0:
+                palettes += tileset_palettes[:primary_palettes_count]
+            else:
+                palettes += tileset_palettes[primary_palettes_count:]
+            metatiles += bytes(contents[metatiles_offset:metatiles_offset + tiles_count * 16]).ljust(
+                tiles_count * 16, b'\x00'
+            )
+            tileset_offsets.append(tileset_offset)
+
+        return MapLayout(
+            width, height, blocks, gba_image.TileSheet(tiles), palettes, metatiles,
+            tileset_offsets[0], tileset_offsets[1], primary_tiles_count
+        )
+
+    def get_tileset_tile_base(self, map_layout):
+        """
+        Returns the number of the first tile of the loaded tileset in the map,
+        or None if the map doesn't use it
+        """
+        if self.tileset_header_offset == map_layout.primary_tileset_offset:
+            return 0
+        if self.tileset_header_offset == map_layout.secondary_tileset_offset:
+            return map_layout.secondary_tile_base
+        return None
+
+    def get_tileset(self):
+        return self.tileset
+
+    def get_palette(self):
+        """Returns the selected palette, in GBA format"""
+        return self.tileset_palettes[self.selected_palette]
 
     def set_selected_palette(self, index):
         if not (0 <= index < 16):
@@ -152,6 +365,9 @@ class JaaeHandler:
     def get_animations_count(self):
         return len(self.animations)
 
+    def get_animations(self):
+        return self.animations
+
     def add_animation(self):
         if not self.can_add_animation():
             raise JaaeError('Cannot add more than 20 animations.')
@@ -266,16 +482,15 @@ class JaaeHandler:
         except OSError:
             raise JaaeError('Not a valid image.')
         try:
-            data = gba_image.from_img_to_4bpp(img)
+            sheet = gba_image.TileSheet(gba_image.from_img_to_4bpp(img))
         except gba_image.ImageFormatError as e:
             raise JaaeError(str(e))
 
-        if len(data) % (32 * split_image_in) != 0:
+        if len(sheet) % (32 * split_image_in) != 0:
             raise JaaeError('Cannot split image in "{0}" frames.'.format(split_image_in))
 
-        frame_size = len(data) // split_image_in
-        for i in range(len(labels_to_add)):
-            self.frames[labels_to_add[i]] = data[i * frame_size:(i + 1) * frame_size]
+        for label_to_add, frame_sheet in zip(labels_to_add, sheet.split(split_image_in)):
+            self.frames[label_to_add] = frame_sheet
 
     def animation_matches_frame(self):
         if self.working_animation is None or self.working_frame is None:
@@ -285,7 +500,7 @@ class JaaeHandler:
             return True
         start = self.get_animation_start()
         end = self.get_animation_end()
-        return (end - start + 1) == (len(self.frames[label]) // 32)
+        return (end - start + 1) == self.frames[label].get_tile_count()
 
     def is_frame_used(self, label, exclude_working_frame=True):
         for i in range(len(self.animations)):
@@ -331,19 +546,14 @@ class JaaeHandler:
             return None
         return self.animations[self.working_animation].frames[self.working_frame]
 
-    def get_working_frame_image(self, tiles_wide):
+    def get_frame_sheet(self, label):
+        return self.frames.get(label)
+
+    def get_working_frame_sheet(self):
         label = self.get_working_frame_image_label()
         if label is None:
             return None
-        data = self.frames[label]
-        if data is None:
-            return None
-        img = gba_image.from_4bpp_to_img(
-            data,
-            tiles_wide
-        )
-        img.putpalette(self.tileset_palettes[self.selected_palette])
-        return img
+        return self.frames[label]
 
     def export_animations(self, filename):
         if len(self.animations) == 0 and len(self.frames) == 0:
@@ -351,7 +561,7 @@ class JaaeHandler:
         jaae_fileformat.save_file(filename, self.animations, self.frames)
 
     def import_animations(self, filename):
-        if self.tileset_img is None:
+        if self.tileset is None:
             raise JaaeError('No tileset loaded.')
         try:
             self.animations, self.frames = jaae_fileformat.read_file(filename)
@@ -361,19 +571,62 @@ class JaaeHandler:
             raise JaaeError('Invalid JAAE file.')
 
     def get_needed_space(self):
-        size = self.ROUTINE_SIZE + len(self.animations) * 8
+        return animation_routine.get_routine_size(self.animations, self.frames)
+
+    def check_animation_frames(self, animations=None, frames=None):
+        if animations is None:
+            animations, frames = self.animations, self.frames
+        for i in range(len(animations)):
+            try:
+                animation_routine.check_anim_table_entry_fields(
+                    animation_routine.get_anim_table_entry_fields(animations[i])
+                )
+            except animation_routine.InvalidAnimation as e:
+                raise JaaeError('In animation {0}: {1}'.format(i, e))
+            for j in range(len(animations[i].frames)):
+                if animations[i].frames[j] is None:
+                    raise JaaeError('In animation {0}, frame {1} has no assigned image.'.format(i, j))
+                if animations[i].frames[j] not in frames:
+                    raise JaaeError('In animation {0}, frame {1} uses the missing image "{2}".'.format(
+                        i, j, animations[i].frames[j]
+                    ))
+
+    def get_routine_build_key(self, offset):
+        """
+        Hash of everything the assembled routine depends on, or None if the
+        sources can't be read
+        """
+        parts = [self.rom_code, ('SECONDARY', 'PRIMARY')[self.is_primary_tileset], hex(0x8000000 | offset)]
+        try:
+            for source in self.ROUTINE_SOURCES:
+                with open(os.path.join(JAAE_BASE_PATH, source), 'rb') as f:
+                    parts.append(f.read())
+        except OSError:
+            return None
         for animation in self.animations:
-            size += 4 * len(animation.frames)
+            parts.append('{0} {1} {2} {3}'.format(
+                animation.start_tile, animation.end_tile, animation.speed, len(animation.frames)
+            ))
+            parts.extend(animation.frames)
         for label in self.frames:
-            size += len(self.frames[label])
-        return size
-
-    def insert_to_rom(self, offset):
-        if not 0 <= offset < 0x10000000:
-            raise JaaeError('Invalid offset')
-        if offset % 4 != 0:
-            raise JaaeError('The offset must be aligned. It has to end in 0, 4, 8 or C.')
-        offset &= 0x7ffffff
+            parts.append(label)
+            parts.append(self.frames[label].data)
+        return BuildCache.get_key(*parts)
+
+    def assemble_routine(self, offset):
+        """
+        Assembles resources/base_routines.s with DevkitARM, for routines
+        customized there. Returns the output of the tools and the binary,
+        which is None if they failed. Binaries are kept in the build cache,
+        so the same inputs are never assembled twice
+        """
+        if self.rom_code is None:
+            self.read_rom_code()
+        key = self.get_routine_build_key(offset)
+        if key is not None:
+            routine = self.build_cache.get(key)
+            if routine is not None:
+                return 'Using the routine assembled before from the same sources and animations.\n', routine
 
         # Check environment
         initial_path = os.path.abspath('.')
@@ -393,7 +646,7 @@ class JaaeHandler:
         frames_txt = ''
         for label in self.frames:
             frames_txt += 'frame_img_{0}:\n.byte {1}\n'.format(
-                label, ','.join(str(n) for n in self.frames[label])
+                label, ','.join(str(n) for n in self.frames[label].data)
             )
         # Generate animation table text
         animation_header_table_txt = '.align 2\nAnimHeaderTable:\n'
@@ -404,13 +657,11 @@ class JaaeHandler:
                 self.animations[i].start_tile,
                 self.animations[i].end_tile - self.animations[i].start_tile + 1,
                 self.animations[i].speed,
-                self.get_animation_frame_count() - 1
+                self.animations[i].get_frame_count() - 1
             )
 
             frames_tables_txt += 'AnimationTable{0}:\n'.format(i)
             for j in range(len(self.animations[i].frames)):
-                if self.animations[i].frames[j] is None:
-                    raise JaaeError('In animation {0}, frame {1} has no assigned image.'.format(i, j))
                 frames_tables_txt += '.4byte frame_img_{0} + INSERTION_OFFSET\n'.format(
                     self.animations[i].frames[j]
                 )
@@ -423,7 +674,7 @@ class JaaeHandler:
             f.write(frames_txt)
 
         # Assemble
-        inserted = False
+        routine = None
         output_txt = ''
         p = subprocess.Popen(
             args=[
@@ -451,21 +702,10 @@ class JaaeHandler:
 
             if p.returncode == 0:
                 output_txt += '\nBinary generated successfully.\n'
-
-                # Insert to rom
-                with open(self.rom_filename, 'rb+') as f:
-                    # Write pointer to the routine
-                    f.seek(self.tileset_header_offset + (0x14, 0x10)[self.rom_code == 'BPRE'])
-                    f.write((offset | 0x8000001).to_bytes(4, 'little'))
-
-                    # Write routine
-                    f.seek(offset)
-                    if f.tell() != offset:
-                        f.write(b'\xff' * (offset - f.tell()))
-                    with open(self.TMP_BIN, 'rb') as f2:
-                        f.write(f2.read())
-                    inserted = True
-
+                with open(self.TMP_BIN, 'rb') as f:
+                    routine = f.read()
+                if key is not None:
+                    self.build_cache.put(key, routine)
             else:
                 output_txt += '\nError generating binary.\n'
         else:
@@ -482,5 +722,219 @@ class JaaeHandler:
         if initial_path != JAAE_BASE_PATH:
             os.chdir(initial_path)
 
+        return output_txt, routine
+
+    def build_routine(self, offset):
+        """Lays out the routine and the animations without assembling anything"""
+        if self.rom_code is None:
+            self.read_rom_code()
+        routine = animation_routine.build_routine(
+            self.animations, self.frames, self.rom_code, self.is_primary_tileset, offset
+        )
+        output_txt = 'Routine of {0} bytes built for {1} at {2}.\n'.format(
+            len(routine), self.rom_code, hex(0x8000000 | offset)
+        )
+        return output_txt, routine
+
+    def get_free_space_index(self, fill=0xff):
+        """The free blocks of the ROM, scanned again only if the file changed"""
+        rom = self.get_rom()
+        identity, index = self.free_space.get(fill, (None, None))
+        if identity != rom.get_identity():
+            index = FreeSpaceIndex.scan(rom, fill)
+            self.free_space[fill] = (rom.get_identity(), index)
+        return index
+
+    def find_free_space(self, size=None, fill=0xff):
+        """
+        Returns the best fitting aligned offset with size bytes of free space,
+        the space the animations need by default. None if there isn't any
+        """
+        if size is None:
+            size = self.get_needed_space()
+        return self.get_free_space_index(fill).find_best_fit(size)
+
+    def update_free_space(self, identity, writes):
+        """
+        Removes the (offset, size) writes from the free space indexes scanned
+        from the ROM with identity, which are made valid for it as it is now
+        """
+        indexes = {
+            fill: index for fill, (index_identity, index) in self.free_space.items()
+            if index_identity == identity
+        }
+        self.free_space = {}
+        if indexes:
+            new_identity = self.get_rom().get_identity()
+            for fill, index in indexes.items():
+                for offset, size in writes:
+                    index.allocate(offset, size)
+                self.free_space[fill] = (new_identity, index)
+
+    def get_change_set(self, writes):
+        change_set = ChangeSet(self.get_rom())
+        for offset, data in writes:
+            change_set.write(offset, data)
+        return change_set
+
+    def write_to_rom(self, writes):
+        """
+        Writes the bytes the (offset, data) writes change, in a single pass
+        over the ROM mapped for writing. The file grows with 0xff when they
+        go past its end
+        """
+        change_set = self.get_change_set(writes)
+        changes = change_set.get_changes()
+        size = change_set.get_size()
+        # The free space indexes are kept up to date only if they match the file being written
+        identity = self.rom.get_identity()
+        # The read-only mapping is closed while the file is written, it's
+        # mapped again the next time it's needed
+        self.rom.close()
+        with open(self.rom_filename, 'rb+') as f:
+            if f.seek(0, os.SEEK_END) < size:
+                f.truncate(size)
+            if changes:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as contents:
+                    for offset, data in changes:
+                        contents[offset:offset + len(data)] = data
+                    contents.flush()
+        self.update_free_space(identity, [(offset, len(data)) for offset, data in writes])
+
+    def save_patch(self, writes, filename):
+        """
+        Saves the writes as an IPS or UPS patch of the ROM, by the extension
+        of filename, leaving the ROM as it is. Returns the size of the patch
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in ('.ips', '.ups'):
+            raise JaaeError('Unknown patch format "{0}", it has to be .ips or .ups.'.format(extension))
+        change_set = self.get_change_set(writes)
+        try:
+            patch = change_set.make_ips() if extension == '.ips' else change_set.make_ups()
+        except PatchError as e:
+            raise JaaeError(str(e))
+        with open(filename, 'wb') as f:
+            f.write(patch)
+        return len(patch)
+
+    def commit_writes(self, writes, patch_filename=None):
+        """Writes to the ROM, or saves the writes as a patch when patch_filename is given"""
+        if patch_filename is None:
+            self.write_to_rom(writes)
+            return ''
+        return 'Patch of {0} bytes saved to "{1}".\n'.format(self.save_patch(writes, patch_filename), patch_filename)
+
+    def get_routine_writes(self, header_offset, offset, routine):
+        """The routine at offset, and the pointer to it in the tileset header"""
+        pointer_offset = header_offset + tileset_catalog.CALLBACK_POINTER_OFFSETS[self.rom_code]
+        return [(pointer_offset, (offset | 0x8000001).to_bytes(4, 'little')), (offset, routine)]
+
+    @staticmethod
+    def check_insertion_offset(offset):
+        """Returns the offset in the ROM of the insertion offset, which can be a pointer"""
+        if not 0 <= offset < 0x10000000:
+            raise JaaeError('Invalid offset')
+        if offset % 4 != 0:
+            raise JaaeError('The offset must be aligned. It has to end in 0, 4, 8 or C.')
+        return offset & 0x7ffffff
+
+    def insert_to_rom(self, offset, use_devkitarm=False, patch_filename=None):
+        offset = self.check_insertion_offset(offset)
+        self.check_animation_frames()
+
+        if use_devkitarm:
+            output_txt, routine = self.assemble_routine(offset)
+        else:
+            output_txt, routine = self.build_routine(offset)
+        inserted = False
+        if routine is not None:
+            output_txt += self.commit_writes(
+                self.get_routine_writes(self.tileset_header_offset, offset, routine), patch_filename
+            )
+            inserted = True
         return output_txt, inserted
 
+    def read_project(self, project):
+        """The animations and frames of a JAAE file name, or of an (animations, frames) pair"""
+        if not isinstance(project, str):
+            return project
+        try:
+            return jaae_fileformat.read_file(project)
+        except jaae_fileformat.InvalidJaaeFileFormat:
+            raise JaaeError('Invalid JAAE file "{0}".'.format(project))
+        except OSError as e:
+            raise JaaeError('Couldn\'t read "{0}": {1}'.format(project, e.strerror))
+
+    def insert_batch(self, projects, offset=None, fill=0xff, patch_filename=None):
+        """
+        Inserts the animations of many tilesets at once. projects is a list
+        of (tileset header offset, project) pairs, a project being what
+        read_project takes. The routines are laid out one after the other
+        from offset, or by default where they fit in the free space, and the
+        ROM is written in a single pass, or saved as a patch of it when
+        patch_filename is given. A header offset can be a pointer, and can
+        only be given once. Returns the output text, which says where the
+        patch went, and an InsertionReport for each pair. The tilesets that
+        fail are reported and left as they were
+        """
+        if offset is not None:
+            offset = self.check_insertion_offset(offset)
+        contents = self.get_rom()
+        if self.rom_code is None:
+            self.read_rom_code(contents)
+
+        reports = []
+        pending = []
+        header_offsets = set()
+        for header_offset, project in projects:
+            report = InsertionReport(header_offset)
+            reports.append(report)
+            try:
+                header_offset = report.header_offset = self.check_insertion_offset(header_offset)
+                if not tileset_catalog.is_tileset_header(contents, header_offset):
+                    raise JaaeError('There is no tileset header at {0}.'.format(hex(header_offset)))
+                # A second routine for the same tileset would be left in the ROM unused
+                if header_offset in header_offsets:
+                    raise JaaeError('The tileset is already in the batch.')
+                animations, frames = self.read_project(project)
+                self.check_animation_frames(animations, frames)
+            except JaaeError as e:
+                report.error = str(e)
+                continue
+            header_offsets.add(header_offset)
+            report.is_primary = contents[header_offset + 1] == 0
+            report.animation_count = len(animations)
+            report.frame_count = len(frames)
+            report.size = animation_routine.get_routine_size(animations, frames)
+            pending.append((report, animations, frames))
+
+        # Lay out the routines together if possible, one by one if they only fit apart
+        sizes = [-(-report.size // 4) * 4 for report, _, _ in pending]
+        if offset is None:
+            free_space = self.get_free_space_index(fill).copy()
+            offset = free_space.find_best_fit(sum(sizes))
+        if offset is not None:
+            for (report, _, _), size in zip(pending, sizes):
+                report.routine_offset = offset
+                offset += size
+        else:
+            for report, _, _ in pending:
+                report.routine_offset = free_space.find_best_fit(report.size)
+                if report.routine_offset is None:
+                    report.error = "There isn't enough free space for the animations."
+                else:
+                    free_space.allocate(report.routine_offset, report.size)
+
+        writes = []
+        for report, animations, frames in pending:
+            if report.inserted():
+                routine = animation_routine.build_routine(
+                    animations, frames, self.rom_code, report.is_primary, report.routine_offset
+                )
+                writes.extend(self.get_routine_writes(report.header_offset, report.routine_offset, routine))
+        output_txt = ''
+        if writes:
+            output_txt = self.commit_writes(writes, patch_filename)
+        return output_txt, reports
+
@@ -4,6 +4,7 @@ from PyQt5 import QtWidgets, QtGui
 from .jaae_handler import JaaeError
 from . import main_window
 from .load_tileset_ui import Ui_LoadTilesetDialog
+from .tileset_catalog_dialog import TilesetCatalogDialog
 
 
 class LoadTilesetDialog(QtWidgets.QDialog):
@@ -24,6 +25,7 @@ class LoadTilesetDialog(QtWidgets.QDialog):
         self.ui.tileset_header_txt.returnPressed.connect(self.load_tileset)
         self.ui.load_tileset_btn.clicked.connect(self.load_tileset)
         self.ui.load_tileset_btn.setEnabled(False)
+        self.ui.browse_btn.clicked.connect(self.browse_tilesets)
 
 
     def error_message(self, description):
@@ -43,6 +45,12 @@ class LoadTilesetDialog(QtWidgets.QDialog):
             except JaaeError as e:
                 self.error_message(str(e))
 
+    def browse_tilesets(self):
+        dialog = TilesetCatalogDialog(self.handler)
+        if dialog.exec() == QtWidgets.QDialog.Accepted:
+            self.ui.tileset_header_txt.setText(hex(dialog.selected_header_offset))
+            self.load_tileset()
+
     def translate_from_amap_number(self):
         txt = self.ui.amap_tileset_number_txt.text()
         if txt:
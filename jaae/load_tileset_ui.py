@@ -34,6 +34,9 @@ class Ui_LoadTilesetDialog(object):
         self.tileset_header_txt = QtWidgets.QLineEdit(LoadTilesetDialog)
         self.tileset_header_txt.setObjectName("tileset_header_txt")
         self.gridLayout.addWidget(self.tileset_header_txt, 1, 1, 1, 1)
+        self.browse_btn = QtWidgets.QPushButton(LoadTilesetDialog)
+        self.browse_btn.setObjectName("browse_btn")
+        self.gridLayout.addWidget(self.browse_btn, 1, 2, 1, 1)
         self.load_tileset_btn = QtWidgets.QPushButton(LoadTilesetDialog)
         self.load_tileset_btn.setObjectName("load_tileset_btn")
         self.gridLayout.addWidget(self.load_tileset_btn, 2, 1, 1, 1)
@@ -50,5 +53,6 @@ class Ui_LoadTilesetDialog(object):
 "tileset number for some\n"
 "reason:"))
         self.label.setText(_translate("LoadTilesetDialog", "Tileset header offset:"))
+        self.browse_btn.setText(_translate("LoadTilesetDialog", "Browse..."))
         self.load_tileset_btn.setText(_translate("LoadTilesetDialog", "Load tileset"))
 
@@ -7,111 +7,368 @@ class InvalidLz77Data(Exception):
     pass
 
 
+_FLAG_BITS = (0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01)
+
+
 def decompress(compressed_data):
     '''Decompresses lz77-compressed images in GBA ROMs.
        Algorithm originally ported from NLZ-Advance code
        (which has copyright by Nintenlord)
-       compressed data must be either a bytes() or a bytearray()
+       compressed data can be a bytes(), a bytearray() or a memoryview()
        (this function was ported to python by cosarara97)'''
+    if len(compressed_data) < 4 or compressed_data[0] != 0x10:
+        raise InvalidLz77Data('Not valid lz77 data')
     size = to_int(compressed_data[1:4])
     decompressed_data = bytearray(size)
-    if compressed_data[0] != 0x10:
-        raise InvalidLz77Data('Not valid lz77 data')
+    comp_len = len(compressed_data)
     decomp_pos = 0
     comp_pos = 4
-    while decomp_pos < size:
-        # Every bit of this byte maps to one of the eight following blocks
-        # if the bit is 1, that block is compressed
-        byte = compressed_data[comp_pos]
-        are_compressed = [(byte >> 7-i) & 1 for i in range(8)]
-        comp_pos += 1
-        # for block_i, is_compressed in enumerate(are_compressed):
-        for is_compressed in are_compressed:
-            if is_compressed:
-                amount_to_copy = 3 + (compressed_data[comp_pos]>>4)
-                to_copy_from = (1 +
-                                ((compressed_data[comp_pos] & 0xF) << 8) +
-                                compressed_data[comp_pos + 1])
-                if to_copy_from > size:
-                    raise Exception('Not valid lz77 data')
-                tmp_start = decomp_pos - to_copy_from
-                #tmp_start = decomp_pos
-                for i in range(amount_to_copy):
-                    if decomp_pos >= size:
+    try:
+        while decomp_pos < size:
+            # Every bit of this byte maps to one of the eight following blocks
+            # if the bit is 1, that block is compressed
+            flags = compressed_data[comp_pos]
+            comp_pos += 1
+            if flags == 0 and decomp_pos + 8 <= size and comp_pos + 8 <= comp_len:
+                # Eight raw bytes in a row, copy them at once
+                decompressed_data[decomp_pos:decomp_pos + 8] = compressed_data[comp_pos:comp_pos + 8]
+                decomp_pos += 8
+                comp_pos += 8
+                continue
+
+            for bit in _FLAG_BITS:
+                if decomp_pos >= size:
+                    # The output is full, but compressed blocks that are left
+                    # in this flag byte still count as part of the data
+                    if not flags & bit:
                         break
-                    decompressed_data[decomp_pos] = decompressed_data[
-                        tmp_start + i
-                        #tmp_start - to_copy_from + i
-                    ]
+                    comp_pos += 2
+                elif flags & bit:
+                    byte = compressed_data[comp_pos]
+                    copy_end = decomp_pos + 3 + (byte >> 4)
+                    tmp_start = decomp_pos - 1 - (((byte & 0xF) << 8) | compressed_data[comp_pos + 1])
+                    comp_pos += 2
+                    if tmp_start < 0:
+                        raise InvalidLz77Data('Not valid lz77 data')
+                    if copy_end > size:
+                        copy_end = size
+                    if copy_end - decomp_pos <= decomp_pos - tmp_start:
+                        decompressed_data[decomp_pos:copy_end] = \
+                            decompressed_data[tmp_start:tmp_start + copy_end - decomp_pos]
+                    else:
+                        # The block overlaps with itself, so it repeats the
+                        # bytes between tmp_start and decomp_pos
+                        chunk = decompressed_data[tmp_start:decomp_pos]
+                        chunk *= (copy_end - decomp_pos) // len(chunk) + 1
+                        decompressed_data[decomp_pos:copy_end] = chunk[:copy_end - decomp_pos]
+                    decomp_pos = copy_end
+                else:
+                    decompressed_data[decomp_pos] = compressed_data[comp_pos]
                     decomp_pos += 1
-                comp_pos += 2
+                    comp_pos += 1
+    except IndexError:
+        raise InvalidLz77Data('Truncated lz77 data')
+    return decompressed_data, comp_pos  # comp_pos contains the size of the compressed data
+
+
+CHUNK_SIZE = 0x1000
+READ_SIZE = 0x10000
+# A flag byte and its eight blocks can't take more than this
+MAX_GROUP_SIZE = 1 + 8 * 2
 
+
+def _read_blocks(source):
+    if hasattr(source, 'read'):
+        while True:
+            block = source.read(READ_SIZE)
+            if not block:
+                return
+            yield block
+    else:
+        yield memoryview(source)
+
+
+class StreamDecompressor:
+    """
+    Decompresses lz77 data incrementally. Iterating over it yields the output
+    in chunks of about chunk_size bytes, keeping only the last 4 KiB of output
+    around for the back-references.
+    source can be a bytes-like object (read through a memoryview, so slicing
+    a memoryview of the ROM doesn't copy anything) or a binary file object
+    positioned at the start of the data.
+    If max_size is given, decoding stops after that many bytes.
+    decompressed_size has the size declared in the header once iteration
+    starts, and compressed_size has the size of the compressed data once the
+    whole data has been decoded
+    """
+    def __init__(self, source, max_size=None, chunk_size=CHUNK_SIZE):
+        self.source = source
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.decompressed_size = None
+        self.compressed_size = None
+        self._blocks = None
+        self._buf = b''
+        self._consumed = 0
+        self._exhausted = False
+
+    def _fill(self, comp_pos, needed):
+        """
+        Reads from the source until there are needed bytes from comp_pos on,
+        or the source runs out. Returns the new comp_pos
+        """
+        while len(self._buf) - comp_pos < needed and not self._exhausted:
+            block = next(self._blocks, None)
+            if block is None:
+                self._exhausted = True
+            elif comp_pos == len(self._buf):
+                self._consumed += comp_pos
+                self._buf = block
+                comp_pos = 0
             else:
-                if decomp_pos >= size:
-                    break
-                decompressed_data[decomp_pos] = compressed_data[comp_pos]
-                decomp_pos += 1
+                self._consumed += comp_pos
+                self._buf = bytes(self._buf[comp_pos:]) + bytes(block)
+                comp_pos = 0
+        return comp_pos
+
+    def __iter__(self):
+        self._blocks = _read_blocks(self.source)
+        self._buf = b''
+        self._consumed = 0
+        self._exhausted = False
+        comp_pos = self._fill(0, 4)
+        buf = self._buf
+        if len(buf) - comp_pos < 4 or buf[comp_pos] != 0x10:
+            raise InvalidLz77Data('Not valid lz77 data')
+        size = to_int(buf[comp_pos + 1:comp_pos + 4])
+        self.decompressed_size = size
+        limit = size if self.max_size is None else min(size, self.max_size)
+        comp_pos += 4
+
+        out = bytearray()
+        dropped = 0  # output bytes that are no longer in out
+        emitted = 0  # position in out up to which the output was yielded
+        try:
+            while dropped + len(out) < limit:
+                if len(buf) - comp_pos < MAX_GROUP_SIZE and not self._exhausted:
+                    comp_pos = self._fill(comp_pos, MAX_GROUP_SIZE)
+                    buf = self._buf
+                flags = buf[comp_pos]
                 comp_pos += 1
-            if decomp_pos > size:
-                break
-    return decompressed_data, comp_pos  # comp_pos contains the size of the compressed data
+                for bit in _FLAG_BITS:
+                    produced = dropped + len(out)
+                    if produced >= limit:
+                        # Like decompress, compressed blocks left in the flag
+                        # byte count as part of the data
+                        if limit < size or not flags & bit:
+                            break
+                        comp_pos += 2
+                    elif flags & bit:
+                        byte = buf[comp_pos]
+                        amount_to_copy = 3 + (byte >> 4)
+                        to_copy_from = 1 + (((byte & 0xF) << 8) | buf[comp_pos + 1])
+                        comp_pos += 2
+                        if to_copy_from > produced:
+                            raise InvalidLz77Data('Not valid lz77 data')
+                        if amount_to_copy > limit - produced:
+                            amount_to_copy = limit - produced
+                        tmp_start = len(out) - to_copy_from
+                        if amount_to_copy <= to_copy_from:
+                            out += out[tmp_start:tmp_start + amount_to_copy]
+                        else:
+                            chunk = out[tmp_start:]
+                            chunk *= amount_to_copy // to_copy_from + 1
+                            out += chunk[:amount_to_copy]
+                    else:
+                        out.append(buf[comp_pos])
+                        comp_pos += 1
+
+                if len(out) - emitted >= self.chunk_size:
+                    yield out[emitted:]
+                    emitted = len(out)
+                    if len(out) > WINDOW_SIZE:
+                        to_drop = len(out) - WINDOW_SIZE
+                        del out[:to_drop]
+                        dropped += to_drop
+                        emitted -= to_drop
+        except IndexError:
+            raise InvalidLz77Data('Truncated lz77 data')
+
+        if emitted < len(out):
+            yield out[emitted:]
+        if limit == size:
+            self.compressed_size = self._consumed + comp_pos
+
+
+def decompress_head(source, length):
+    """
+    Decompresses only the first length bytes of the lz77 data in source
+    """
+    return b''.join(StreamDecompressor(source, max_size=length))
 
 
-def search_repeated_bytes(data, position, size):
+def validate(source):
     """
-    This was also taken from NLZ-Advance
-    and optimized for python
+    Decodes the whole lz77 data in source without keeping it.
+    Raises InvalidLz77Data if it isn't valid, and
+    returns (compressed size, decompressed size) otherwise
+    """
+    decompressor = StreamDecompressor(source, chunk_size=READ_SIZE)
+    for _ in decompressor:
+        pass
+    return decompressor.compressed_size, decompressor.decompressed_size
+
+
+WINDOW_SIZE = 0x1000
+MIN_MATCH = 3
+MAX_MATCH = 18
+# The BIOS VRAM decompressor writes 16 bits at a time, so a block can't
+# copy from the byte right before it
+MIN_DISPLACEMENT = 2
+MAX_CHAIN = 128
+# Bits taken by each kind of block, counting its flag bit
+LITERAL_COST = 9
+MATCH_COST = 17
+
+# How many hash chain candidates each level checks per position. This is
+# what bounds the time each level takes: "fast" is meant for interactive
+# use (a 16 KiB tileset in a few tens of ms), "optimal" for the final
+# build (a few hundred ms for the same tileset).
+COMPRESSION_LEVELS = {
+    'fast': MAX_CHAIN,
+    'optimal': 1024,
+}
+
+
+def build_hash_chains(data):
     """
-    if position < 3 or (size - position) < 3:
+    Returns a list that, for each position of data, has the previous
+    position that starts with the same three bytes (or -1 if there is none)
+    """
+    chains = [-1] * len(data)
+    last_seen = {}
+    for position in range(len(data) - MIN_MATCH + 1):
+        key = data[position:position + MIN_MATCH]
+        chains[position] = last_seen.get(key, -1)
+        last_seen[key] = position
+    return chains
+
+
+def search_match(data, position, size, chains, max_chain=MAX_CHAIN):
+    """
+    Walks the hash chain of position looking for the longest match inside
+    the window. Returns (length, displacement), or (0, 0) if there is none
+    """
+    max_length = min(MAX_MATCH, size - position)
+    if max_length < MIN_MATCH:
         return 0, 0
-    elif position >= size:
-        return -1, 0
-
-    result = None
-    for i in range(3, 19):
-        f_res = data.find(data[position:position + 1 + i], max(0, position - 0x1000), position)
-        if f_res != -1:
-            result = (i, (position - f_res))
-        else:
-            break
-    if result is None:
+
+    window_start = position - WINDOW_SIZE
+    best_length = MIN_MATCH - 1
+    best_displacement = 0
+    candidate = chains[position]
+    while candidate >= window_start and candidate != -1 and max_chain > 0:
+        max_chain -= 1
+        # Only a match longer than the best one is worth checking
+        if position - candidate >= MIN_DISPLACEMENT and \
+                data[candidate + best_length] == data[position + best_length] and \
+                data[candidate:candidate + best_length] == data[position:position + best_length]:
+            length = best_length + 1
+            while length < max_length and data[candidate + length] == data[position + length]:
+                length += 1
+            best_length = length
+            best_displacement = position - candidate
+            if length == max_length:
+                break
+        candidate = chains[candidate]
+
+    if best_displacement == 0:
         return 0, 0
-    else:
-        return result
+    return best_length, best_displacement
 
 
-def compress(data):
+def greedy_parse(data, size, chains, max_chain):
     """
-    And this too!
-    Thanks Nintenlord!
+    Takes the longest match at every position.
+    Returns a list of (length, displacement) blocks, length 0 being a raw byte
     """
-    size = len(data)
+    blocks = []
     position = 0
-    compressed_data = b'\x10' + size.to_bytes(3, 'little')
+    while position < size:
+        block = search_match(data, position, size, chains, max_chain)
+        blocks.append(block)
+        position += block[0] or 1
+    return blocks
+
+
+def optimal_parse(data, size, chains, max_chain):
+    """
+    Chooses the blocks that give the smallest output, going backwards from the
+    end of data and keeping the cheapest way of encoding every suffix.
+    Any length between 3 and the longest match at a position is a valid match,
+    so only the longest one needs to be searched.
+    Returns a list of (length, displacement) blocks, length 0 being a raw byte
+    """
+    matches = [search_match(data, position, size, chains, max_chain) for position in range(size)]
+    cost = [0] * (size + 1)
+    chosen_length = [0] * size
+    for position in range(size - 1, -1, -1):
+        best_cost = cost[position + 1] + LITERAL_COST
+        best_length = 0
+        for length in range(matches[position][0], MIN_MATCH - 1, -1):
+            length_cost = cost[position + length] + MATCH_COST
+            if length_cost < best_cost:
+                best_cost = length_cost
+                best_length = length
+        cost[position] = best_cost
+        chosen_length[position] = best_length
 
+    blocks = []
+    position = 0
     while position < size:
-        blocks_compress_flags = 0
-        block_data = b''
-        i = 0
-        while i < 8 and position < size:
-            search_result = search_repeated_bytes(data, position, size)
-            if search_result[0] > 2:
-                block_data += (((search_result[0] - 3) << 12) |
-                               (search_result[1] - 1)).to_bytes(2, 'big')
-                position += search_result[0]
-
-                blocks_compress_flags |= 1 << (7 - i)
-            elif search_result[0] >= 0:
-                block_data += data[position:position + 1]
-                position += 1
-            else:
-                break
-            i += 1
+        length = chosen_length[position]
+        if length:
+            blocks.append((length, matches[position][1]))
+            position += length
+        else:
+            blocks.append((0, 0))
+            position += 1
+    return blocks
 
-        compressed_data += blocks_compress_flags.to_bytes(1, 'little') + block_data
 
-    compressed_data += b'\x00' * (0, 3, 2, 1)[len(compressed_data) % 4]
+def compress(data, level='fast'):
+    """
+    Compresses data in the GBA BIOS lz77 format (type 0x10),
+    finding the matches with hash chains over the window.
+    level is one of COMPRESSION_LEVELS: "fast" does a greedy parse,
+    "optimal" searches more candidates and does an optimal parse
+    """
+    if level not in COMPRESSION_LEVELS:
+        raise ValueError('Unknown compression level "{0}".'.format(level))
+    data = bytes(data)
+    size = len(data)
+    chains = build_hash_chains(data)
+    if level == 'optimal':
+        blocks = optimal_parse(data, size, chains, COMPRESSION_LEVELS[level])
+    else:
+        blocks = greedy_parse(data, size, chains, COMPRESSION_LEVELS[level])
 
-    return compressed_data
+    position = 0
+    compressed_data = bytearray(b'\x10' + size.to_bytes(3, 'little'))
+    for i in range(0, len(blocks), 8):
+        flags_pos = len(compressed_data)
+        compressed_data.append(0)
+        blocks_compress_flags = 0
+        for bit, (length, displacement) in zip(_FLAG_BITS, blocks[i:i + 8]):
+            if length:
+                compressed_data += (((length - 3) << 12) | (displacement - 1)).to_bytes(2, 'big')
+                position += length
+                blocks_compress_flags |= bit
+            else:
+                compressed_data.append(data[position])
+                position += 1
+        compressed_data[flags_pos] = blocks_compress_flags
 
+    compressed_data += b'\x00' * (0, 3, 2, 1)[len(compressed_data) % 4]
 
+    return bytes(compressed_data)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from . import lz77
+from .rom_image import make_rom_pool, get_worker_rom
+
+MIN_DECOMPRESSED_SIZE = 32
+MAX_DECOMPRESSED_SIZE = 0x40000
+# The most a compressed byte can expand to is a bit more than 8 bytes
+# (a back-reference of 18 bytes takes 2 bytes and 2 flag bits)
+MAX_EXPANSION = 9
+HEAD_CHECK_SIZE = 0x100
+CHUNKS_PER_PROCESS = 8
+
+
+def find_candidates(data, start, end,
+                    min_size=MIN_DECOMPRESSED_SIZE, max_size=MAX_DECOMPRESSED_SIZE):
+    """
+    Returns the 4-byte-aligned offsets in [start, end) with a lz77 header
+    that could belong to tile graphics: declared size multiple of 32 and
+    between min_size and max_size, a first block that isn't a
+    back-reference and enough data left in the ROM to hold it
+    """
+    start += -start % 4
+    candidates = []
+    aligned = bytes(data[start:end:4])
+    index = aligned.find(b'\x10')
+    while index != -1:
+        offset = start + index * 4
+        index = aligned.find(b'\x10', index + 1)
+
+        if offset + 5 > len(data):
+            break
+        size = int.from_bytes(data[offset + 1:offset + 4], 'little')
+        if size % 32 or not min_size <= size <= max_size:
+            continue
+        if data[offset + 4] & 0x80:
+            continue
+        if (len(data) - offset - 4) * MAX_EXPANSION < size:
+            continue
+        candidates.append(offset)
+    return candidates
+
+
+def check_candidate(data, offset):
+    """
+    Returns (offset, compressed size, decompressed size) if there is valid
+    lz77 data at offset, or None otherwise. The first bytes are decoded
+    before the whole data, since most invalid candidates fail early
+    """
+    view = memoryview(data)[offset:]
+    try:
+        lz77.decompress_head(view, HEAD_CHECK_SIZE)
+        compressed_size, decompressed_size = lz77.validate(view)
+    except lz77.InvalidLz77Data:
+        return None
+    finally:
+        view.release()
+    return offset, compressed_size, decompressed_size
+
+
+def scan_range(data, start, end,
+               min_size=MIN_DECOMPRESSED_SIZE, max_size=MAX_DECOMPRESSED_SIZE):
+    found = []
+    for offset in find_candidates(data, start, end, min_size, max_size):
+        result = check_candidate(data, offset)
+        if result is not None:
+            found.append(result)
+    return found
+
+
+def _scan_range_worker(start, end, min_size, max_size):
+    return scan_range(get_worker_rom(), start, end, min_size, max_size)
+
+
+def remove_nested(found):
+    """
+    Drops the results that start inside the compressed data of a previous one,
+    which are almost always lz77-looking bytes in the middle of real data
+    """
+    filtered = []
+    current_end = 0
+    for offset, compressed_size, decompressed_size in sorted(found):
+        if offset >= current_end:
+            filtered.append((offset, compressed_size, decompressed_size))
+            current_end = offset + compressed_size
+    return filtered
+
+
+def scan_rom(filename, processes=None,
+             min_size=MIN_DECOMPRESSED_SIZE, max_size=MAX_DECOMPRESSED_SIZE, keep_nested=False):
+    """
+    Looks for every lz77-compressed graphic in the ROM, splitting the work
+    between processes (os.cpu_count() by default).
+    Returns a list of (offset, compressed size, decompressed size)
+    """
+    rom_size = os.path.getsize(filename)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes == 1:
+        with open(filename, 'rb') as f:
+            found = scan_range(f.read(), 0, rom_size, min_size, max_size)
+    else:
+        chunk_count = processes * CHUNKS_PER_PROCESS
+        chunk_size = -(-rom_size // chunk_count)
+        chunk_size += -chunk_size % 4
+        found = []
+        with make_rom_pool(filename, processes) as executor:
+            futures = [
+                executor.submit(_scan_range_worker, start, min(start + chunk_size, rom_size),
+                                min_size, max_size)
+                for start in range(0, rom_size, chunk_size)
+            ]
+            for future in futures:
+                found.extend(future.result())
+
+    if keep_nested:
+        return sorted(found)
+    return remove_nested(found)
@@ -8,7 +8,10 @@ from .main_window_ui import Ui_mainWindow
 from .jaae_handler import JaaeHandler, JaaeError, JAAE_BASE_PATH
 from .load_tileset_dialog import LoadTilesetDialog
 from .insert_to_rom_dialog import InsertToRomDialog
+from .map_preview_dialog import MapPreviewDialog
 from .tilemap_scene import TilemapScene
+from .animation_player import AnimationPlayer
+from .frame_thumbnails import FrameThumbnailer, get_thumbnail_key, THUMBNAIL_SIZE
 
 
 ICON_PATH = os.path.abspath(os.path.join(JAAE_BASE_PATH, 'resources/jaae.ico'))
@@ -31,14 +34,21 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.actionLoad_Tileset.triggered.connect(self.load_tileset)
         self.ui.actionImport_Animations.triggered.connect(self.import_animations)
         self.ui.actionExport_Animations.triggered.connect(self.export_animations)
+        self.ui.actionPlay_Animations.toggled.connect(self.play_animations_toggled)
+        self.ui.actionMap_Preview.triggered.connect(self.show_map_preview)
 
         # Tileset groupbox
-        self.tileset_scene = TilemapScene(16, clicked_event=self.tileset_clicked)
+        self.tileset_scene = TilemapScene(
+            8, clicked_event=self.tileset_clicked, clicked_dragged_event=self.tileset_dragged
+        )
+        self.tileset_drag_anchor = None
         self.ui.tileset_view.setScene(self.tileset_scene)
+        self.tileset_scene.set_zoom(2)
         self.ui.palette_cmb.currentIndexChanged.connect(self.selected_palette_changed)
         self.header_offset_font = QtGui.QFont(self.ui.header_offset_txt.font())
         self.ui.header_offset_txt.textEdited.connect(self.header_offset_changed)
         self.ui.add_animation_btn.clicked.connect(self.add_animation)
+        self.animation_player = AnimationPlayer(self.handler, self.tileset_scene)
 
         # Animation groupbox
         self.ui.animation_number_cmb.currentIndexChanged.connect(self.working_animation_changed)
@@ -55,11 +65,19 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Frame groupbox
         self.ui.preview_wide_spb.valueChanged.connect(self.frame_preview_wide_changed)
-        self.frame_preview_scene = TilemapScene(16)
+        self.frame_preview_scene = TilemapScene(8)
         self.ui.frame_preview.setScene(self.frame_preview_scene)
+        self.frame_preview_scene.set_zoom(2)
         self.ui.add_frame_btn.clicked.connect(self.add_frame)
         self.ui.frame_lst.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
         self.ui.frame_lst.itemSelectionChanged.connect(self.select_frame_from_list)
+        # Only the thumbnails of the visible rows are made
+        self.frame_thumbnailer = FrameThumbnailer()
+        self.frame_thumbnailer.thumbnail_ready.connect(self.update_frame_thumbnails)
+        self.ui.frame_lst.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.ui.frame_lst.setUniformItemSizes(True)
+        self.ui.frame_lst.verticalScrollBar().valueChanged.connect(self.update_frame_thumbnails)
+        self.ui.frame_lst.verticalScrollBar().rangeChanged.connect(self.update_frame_thumbnails)
         self.ui.frame_warnings_lbl.setVisible(False)
         self.ui.frame_warnings_lbl.setStyleSheet('QLabel { color: red }')
         self.ui.remove_frame_btn.clicked.connect(self.remove_frame)
@@ -67,6 +85,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.tileset_grb.setEnabled(False)
         self.ui.menuEdit.setEnabled(False)
         self.ui.actionInsert_to_ROM.setEnabled(False)
+        self.ui.actionPlay_Animations.setEnabled(False)
+        self.ui.actionMap_Preview.setEnabled(False)
+        self.map_preview_dialog = None
 
     @staticmethod
     def call_disabling_signals(obj, funct_to_call):
@@ -109,6 +130,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         if not self.handler.get_animations_count() or self.yes_no_question('There are animations loaded', "Are you sure you wan't to exit?"):
+            self.frame_thumbnailer.shutdown()
             event.accept()
         else:
             event.ignore()
@@ -118,6 +140,11 @@ class MainWindow(QtWidgets.QMainWindow):
         if filename:
             if self.handler.rom_loaded():
                 self.ui.tileset_grb.setEnabled(False)
+                self.ui.actionPlay_Animations.setChecked(False)
+                self.ui.actionPlay_Animations.setEnabled(False)
+                self.ui.actionMap_Preview.setEnabled(False)
+                if self.map_preview_dialog is not None:
+                    self.map_preview_dialog.close()
                 self.ui.header_offset_txt.setText('')
                 self.tileset_scene.clear()
             self.handler.set_rom_filename(filename)
@@ -141,6 +168,10 @@ class MainWindow(QtWidgets.QMainWindow):
             self.update_animations()
             self.update_tileset_preview()
             self.ui.tileset_grb.setEnabled(True)
+            self.ui.actionPlay_Animations.setEnabled(True)
+            self.ui.actionMap_Preview.setEnabled(True)
+            if self.map_preview_dialog is not None:
+                self.map_preview_dialog.tileset_changed()
 
     def import_animations(self):
         if self.handler.tileset_loaded():
@@ -172,17 +203,21 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.error_message('Error', str(e))
 
     def update_tileset_preview(self):
-        img = self.handler.get_tileset_image()
-        w, h = img.size
-        img = img.resize((w * 2, h * 2))
-        self.tileset_scene.set_image(img)
+        self.tileset_scene.set_tilesheet(
+            self.handler.get_tileset(), 16, self.handler.get_palette()
+        )
+        self.update_tileset_selection()
 
+    def update_tileset_selection(self):
         if self.handler.get_animations_count() > 0:
             start = self.handler.get_animation_start()
             end = self.handler.get_animation_end()
-            self.tileset_scene.draw_rectangle_over_tiles(
+            self.tileset_scene.set_selection(
                 start, end, color=QtGui.QColor(255, 255, 255, 100), fill=True
             )
+        else:
+            self.tileset_scene.clear_selection()
+        self.animation_player.refresh()
 
     def update_animations_start_and_end(self):
         self.start_tile_font.setBold(False)
@@ -220,11 +255,11 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.end_tile_txt.clear()
 
     def update_frame_preview(self):
-        frame_img = self.handler.get_working_frame_image(self.ui.preview_wide_spb.value())
-        if frame_img is not None:
-            w, h = frame_img.size
-            frame_img = frame_img.resize((w * 2, h * 2))
-            self.frame_preview_scene.set_image(frame_img)
+        frame_sheet = self.handler.get_working_frame_sheet()
+        if frame_sheet is not None:
+            self.frame_preview_scene.set_tilesheet(
+                frame_sheet, self.ui.preview_wide_spb.value(), self.handler.get_palette()
+            )
         else:
             self.frame_preview_scene.clear()
 
@@ -250,6 +285,35 @@ class MainWindow(QtWidgets.QMainWindow):
             self.update_frame_list_selection()
         elif force_update_selection:
             self.update_frame_list_selection()
+        self.update_frame_thumbnails()
+
+    def update_frame_thumbnails(self):
+        count = self.ui.frame_lst.count()
+        if count == 0 or not self.handler.tileset_loaded():
+            return
+        viewport = self.ui.frame_lst.viewport()
+        first = self.ui.frame_lst.indexAt(QtCore.QPoint(0, 0)).row()
+        last = self.ui.frame_lst.indexAt(QtCore.QPoint(0, viewport.height() - 1)).row()
+        if first == -1:
+            first = 0
+        if last == -1:
+            last = count - 1
+
+        palette = self.handler.get_palette()
+        for i in range(first, last + 1):
+            item = self.ui.frame_lst.item(i)
+            sheet = self.handler.get_frame_sheet(item.text())
+            if sheet is None:
+                continue
+            key = get_thumbnail_key(sheet, palette)
+            if item.data(QtCore.Qt.UserRole) == key:
+                continue
+            icon = self.frame_thumbnailer.get_thumbnail(key)
+            if icon is None:
+                self.frame_thumbnailer.request_thumbnail(key, sheet, palette)
+            else:
+                item.setIcon(icon)
+                item.setData(QtCore.Qt.UserRole, key)
 
     def update_frames_combobox(self):
         frame_count = self.handler.get_animation_frame_count()
@@ -271,10 +335,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.update_frame_preview()
         self.update_frame_warning()
 
+    def show_map_preview(self):
+        # The dialog isn't modal, so the animations can be edited while it plays them
+        if self.map_preview_dialog is None:
+            self.map_preview_dialog = MapPreviewDialog(self.handler)
+        self.map_preview_dialog.show()
+        self.map_preview_dialog.raise_()
+
+    def play_animations_toggled(self, checked):
+        if checked:
+            self.animation_player.start()
+        else:
+            self.animation_player.stop()
+
     def selected_palette_changed(self):
         self.handler.set_selected_palette(self.ui.palette_cmb.currentIndex())
         self.update_tileset_preview()
         self.update_frame_preview()
+        self.update_frame_thumbnails()
 
     def header_offset_changed(self):
         self.header_offset_font.setBold(True)
@@ -285,7 +363,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.handler.add_animation()
         self.update_animations()
         if previous_working_animation != self.handler.get_working_animation():
-            self.update_tileset_preview()
+            self.update_tileset_selection()
             self.update_frames()
 
     def tileset_clicked(self, event):
@@ -294,12 +372,28 @@ class MainWindow(QtWidgets.QMainWindow):
             tile_num = self.tileset_scene.get_clicked_tile(event)
             if button == QtCore.Qt.LeftButton:
                 self.handler.set_animation_start(tile_num)
+                self.tileset_drag_anchor = tile_num
             elif button == QtCore.Qt.RightButton:
                 self.handler.set_animation_end(tile_num)
-            self.update_tileset_preview()
+            self.update_tileset_selection()
             self.update_animations()
             self.update_frame_warning()
 
+    def tileset_dragged(self, tile_num, button):
+        if self.handler.get_animations_count() > 0:
+            if button == QtCore.Qt.LeftButton and self.tileset_drag_anchor is not None:
+                # Selects from the tile where the drag started to this one
+                start, end = sorted((self.tileset_drag_anchor, tile_num))
+                self.handler.set_animation_start(start)
+                self.handler.set_animation_end(end)
+            elif button == QtCore.Qt.RightButton:
+                self.handler.set_animation_end(tile_num)
+            else:
+                return
+            self.update_tileset_selection()
+            self.update_animations_start_and_end()
+            self.update_frame_warning()
+
     def remove_animation(self):
         if self.yes_no_question(
                 'Remove Animation',
@@ -307,14 +401,14 @@ class MainWindow(QtWidgets.QMainWindow):
         ):
             self.handler.remove_working_animation()
             self.update_animations()
-            self.update_tileset_preview()
+            self.update_tileset_selection()
             self.update_frames()
 
     def working_animation_changed(self):
         self.handler.set_working_animation(self.ui.animation_number_cmb.currentIndex())
 
         self.update_animations(update_working_animation_combobox=False)
-        self.update_tileset_preview()
+        self.update_tileset_selection()
         self.update_frames()
 
     def start_tile_changed(self):
@@ -331,7 +425,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.start_tile_txt.setText(hex(self.handler.get_animation_start()))
 
         self.update_animations_start_and_end()
-        self.update_tileset_preview()
+        self.update_tileset_selection()
 
     def end_tile_changed(self):
         self.end_tile_font.setBold(True)
@@ -347,7 +441,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ui.end_tile_txt.setText(hex(self.handler.get_animation_end()))
 
         self.update_animations_start_and_end()
-        self.update_tileset_preview()
+        self.update_tileset_selection()
 
     def frame_count_changed(self):
         working_frame = self.handler.get_working_frame()
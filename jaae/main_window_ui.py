@@ -281,6 +281,8 @@ class Ui_mainWindow(object):
         self.menuFile.setObjectName("menuFile")
         self.menuEdit = QtWidgets.QMenu(self.menubar)
         self.menuEdit.setObjectName("menuEdit")
+        self.menuView = QtWidgets.QMenu(self.menubar)
+        self.menuView.setObjectName("menuView")
         mainWindow.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(mainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -305,6 +307,11 @@ class Ui_mainWindow(object):
         self.actionLoad_Tileset.setObjectName("actionLoad_Tileset")
         self.actionExport_Animations = QtWidgets.QAction(mainWindow)
         self.actionExport_Animations.setObjectName("actionExport_Animations")
+        self.actionPlay_Animations = QtWidgets.QAction(mainWindow)
+        self.actionPlay_Animations.setCheckable(True)
+        self.actionPlay_Animations.setObjectName("actionPlay_Animations")
+        self.actionMap_Preview = QtWidgets.QAction(mainWindow)
+        self.actionMap_Preview.setObjectName("actionMap_Preview")
         self.menuFile.addAction(self.actionLoad_ROM)
         self.menuFile.addAction(self.actionInsert_to_ROM)
         self.menuFile.addSeparator()
@@ -313,8 +320,11 @@ class Ui_mainWindow(object):
         self.menuEdit.addSeparator()
         self.menuEdit.addAction(self.actionImport_Animations)
         self.menuEdit.addAction(self.actionExport_Animations)
+        self.menuView.addAction(self.actionPlay_Animations)
+        self.menuView.addAction(self.actionMap_Preview)
         self.menubar.addAction(self.menuFile.menuAction())
         self.menubar.addAction(self.menuEdit.menuAction())
+        self.menubar.addAction(self.menuView.menuAction())
 
         self.retranslateUi(mainWindow)
         QtCore.QMetaObject.connectSlotsByName(mainWindow)
@@ -378,6 +388,7 @@ class Ui_mainWindow(object):
         self.label_5.setText(_translate("mainWindow", "End tile:"))
         self.menuFile.setTitle(_translate("mainWindow", "File"))
         self.menuEdit.setTitle(_translate("mainWindow", "Edit"))
+        self.menuView.setTitle(_translate("mainWindow", "View"))
         self.actionAbout.setText(_translate("mainWindow", "About"))
         self.actionLoad_ROM.setText(_translate("mainWindow", "Load ROM"))
         self.actionLoad_Animation.setText(_translate("mainWindow", "Import Animation"))
@@ -388,4 +399,7 @@ class Ui_mainWindow(object):
         self.actionExport_Animation_2.setText(_translate("mainWindow", "Export Animation"))
         self.actionLoad_Tileset.setText(_translate("mainWindow", "Load Tileset"))
         self.actionExport_Animations.setText(_translate("mainWindow", "Export Animations"))
+        self.actionPlay_Animations.setText(_translate("mainWindow", "Play Animations"))
+        self.actionPlay_Animations.setShortcut(_translate("mainWindow", "Ctrl+P"))
+        self.actionMap_Preview.setText(_translate("mainWindow", "Map Preview..."))
 
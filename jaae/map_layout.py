@@ -0,0 +1,106 @@
+import numpy
+
+from . import gba_image
+
+
+TILES_IN_VRAM = 1024
+# Tile entries: tile number, horizontal and vertical flip, palette
+TILE_NUMBER_MASK = 0x3ff
+HFLIP_BIT = 10
+VFLIP_BIT = 11
+PALETTE_SHIFT = 12
+METATILE_ID_MASK = 0x3ff
+# The tiles of a palette in the atlas, 16 tiles wide
+ATLAS_TILES_WIDE = 16
+ATLAS_BAND_WIDTH = ATLAS_TILES_WIDE * 8
+ATLAS_BAND_HEIGHT = TILES_IN_VRAM // ATLAS_TILES_WIDE * 8
+
+
+def get_flipped_tiles(indices):
+    """
+    indices is a tile sheet 16 tiles wide. Returns it next to its copies with
+    every tile flipped horizontally, vertically and both, in the order of the
+    flip bits of the tile entries
+    """
+    h, w = indices.shape
+    tiles = indices.reshape(h // 8, 8, w // 8, 8)
+    variants = (
+        tiles,
+        tiles[:, :, :, ::-1],
+        tiles[:, ::-1, :, :],
+        tiles[:, ::-1, :, ::-1]
+    )
+    return numpy.hstack([variant.reshape(h, w) for variant in variants])
+
+
+class MapLayout:
+    """
+    A map layout, with the tiles, palettes and metatiles of its primary and
+    secondary tilesets placed the way the game loads them
+    """
+    def __init__(self, width, height, blocks, tiles, palettes, metatiles,
+                 primary_tileset_offset, secondary_tileset_offset, secondary_tile_base):
+        self.width = width
+        self.height = height
+        self.blocks = numpy.frombuffer(blocks, dtype='<u2').reshape(height, width)
+        self.tiles = tiles
+        self.palettes = palettes
+        self.metatiles = numpy.frombuffer(metatiles, dtype='<u2').reshape(-1, 8)
+        self.primary_tileset_offset = primary_tileset_offset
+        self.secondary_tileset_offset = secondary_tileset_offset
+        self.secondary_tile_base = secondary_tile_base
+
+    def get_tile_layers(self):
+        """
+        Returns the tile entries of the bottom and top layers of the map,
+        shaped (height * 2, width * 2)
+        """
+        ids = self.blocks & METATILE_ID_MASK
+        ids[ids >= len(self.metatiles)] = 0
+        # (y, x, layer, tile_y, tile_x) -> (layer, y, tile_y, x, tile_x)
+        layers = self.metatiles[ids].reshape(self.height, self.width, 2, 2, 2)
+        layers = layers.transpose(2, 0, 3, 1, 4).reshape(2, self.height * 2, self.width * 2)
+        return layers[0], layers[1]
+
+    def get_color_table(self, transparent=False):
+        """
+        Returns the 16 palettes as a 256-color table for Qt images.
+        With transparent, the first color of every palette is transparent
+        """
+        table = numpy.concatenate([
+            gba_image.get_palette_lut(palette, 'ARGB32') for palette in self.palettes
+        ])
+        if transparent:
+            table[::16] &= 0xffffff
+        return table.tolist()
+
+    def get_atlas_indices(self):
+        """
+        Returns every tile with every palette and flip: one band per palette,
+        each one with the four flips of the tiles side by side. The colors are
+        palette * 16 + color index
+        """
+        flipped = get_flipped_tiles(self.tiles.get_indices(ATLAS_TILES_WIDE))
+        return numpy.vstack([flipped + (palette << 4) for palette in range(16)])
+
+    def get_indices(self):
+        """
+        Returns the map drawn like the game does, with the colors as
+        palette * 16 + color index, shaped (height * 16, width * 16)
+        """
+        tiles = self.tiles.get_indices(1).reshape(-1, 8, 8)
+        layers = []
+        for entries in self.get_tile_layers():
+            pixels = tiles[entries & TILE_NUMBER_MASK]
+            hflip = ((entries >> HFLIP_BIT) & 1).astype(bool)
+            vflip = ((entries >> VFLIP_BIT) & 1).astype(bool)
+            pixels[hflip] = pixels[hflip][:, :, ::-1]
+            pixels[vflip] = pixels[vflip][:, ::-1, :]
+            palettes = (entries >> PALETTE_SHIFT).astype(numpy.uint8) << 4
+            layers.append(numpy.where(pixels != 0, pixels | palettes[:, :, None, None], 0))
+        bottom, top = layers
+        # The color 0 of a layer shows what's under it, the backdrop being color 0
+        pixels = numpy.where(top != 0, top, bottom).astype(numpy.uint8)
+        h, w = pixels.shape[:2]
+        # (tile_y, tile_x, pixel_y, pixel_x) -> (tile_y, pixel_y, tile_x, pixel_x)
+        return numpy.ascontiguousarray(pixels.transpose(0, 2, 1, 3)).reshape(h * 8, w * 8)
@@ -0,0 +1,71 @@
+from PyQt5 import QtWidgets, QtGui
+
+from .jaae_handler import JaaeError
+from . import main_window
+from .map_preview_ui import Ui_MapPreviewDialog
+from .map_scene import MapScene
+
+
+class MapPreviewDialog(QtWidgets.QDialog):
+    def __init__(self, handler):
+        QtWidgets.QDialog.__init__(self)
+        self.ui = Ui_MapPreviewDialog()
+        self.ui.setupUi(self)
+        icon = QtGui.QIcon()
+        icon.addPixmap(QtGui.QPixmap(main_window.ICON_PATH), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        self.setWindowIcon(icon)
+        self.handler = handler
+        self.map_layout_offset = None
+
+        self.map_scene = MapScene(handler)
+        self.ui.map_view.setScene(self.map_scene)
+        self.map_scene.set_zoom(2)
+        self.ui.map_layout_txt.textChanged.connect(self.map_layout_offset_changed)
+        self.ui.map_layout_txt.returnPressed.connect(self.load_map_layout)
+        self.ui.load_map_btn.clicked.connect(self.load_map_layout)
+        self.ui.load_map_btn.setEnabled(False)
+
+    def error_message(self, description):
+        QtWidgets.QMessageBox.critical(self, 'Error', description)
+
+    def load_map_layout(self):
+        txt = self.ui.map_layout_txt.text()
+        if txt:
+            try:
+                offset = int(txt, base=0)
+            except ValueError:
+                self.error_message('Invalid number.')
+                return
+            try:
+                self.map_scene.set_map_layout(self.handler.load_map_layout(offset))
+            except JaaeError as e:
+                self.error_message(str(e))
+                return
+            self.map_layout_offset = offset
+            if self.map_scene.tile_base is None:
+                self.error_message("The map doesn't use the loaded tileset, its animations won't be shown.")
+            self.map_scene.start()
+
+    def tileset_changed(self):
+        """
+        Reads the map layout again, so the animations are placed on the tiles
+        of the tileset loaded now
+        """
+        if self.map_layout_offset is None:
+            return
+        try:
+            self.map_scene.set_map_layout(self.handler.load_map_layout(self.map_layout_offset))
+        except JaaeError:
+            # The ROM changed under the layout
+            self.map_scene.stop()
+            self.map_scene.clear()
+            self.map_layout_offset = None
+
+    def map_layout_offset_changed(self):
+        self.ui.load_map_btn.setEnabled(
+            self.ui.map_layout_txt.text().strip() != ''
+        )
+
+    def closeEvent(self, event):
+        self.map_scene.stop()
+        event.accept()
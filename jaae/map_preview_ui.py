@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'resources/map_preview.ui'
+#
+# Created by: PyQt5 UI code generator 5.9
+#
+# WARNING! All changes made in this file will be lost!
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+class Ui_MapPreviewDialog(object):
+    def setupUi(self, MapPreviewDialog):
+        MapPreviewDialog.setObjectName("MapPreviewDialog")
+        MapPreviewDialog.resize(640, 520)
+        self.gridLayout = QtWidgets.QGridLayout(MapPreviewDialog)
+        self.gridLayout.setObjectName("gridLayout")
+        self.label = QtWidgets.QLabel(MapPreviewDialog)
+        self.label.setObjectName("label")
+        self.gridLayout.addWidget(self.label, 0, 0, 1, 1)
+        self.map_layout_txt = QtWidgets.QLineEdit(MapPreviewDialog)
+        self.map_layout_txt.setObjectName("map_layout_txt")
+        self.gridLayout.addWidget(self.map_layout_txt, 0, 1, 1, 1)
+        self.load_map_btn = QtWidgets.QPushButton(MapPreviewDialog)
+        self.load_map_btn.setObjectName("load_map_btn")
+        self.gridLayout.addWidget(self.load_map_btn, 0, 2, 1, 1)
+        self.map_view = QtWidgets.QGraphicsView(MapPreviewDialog)
+        self.map_view.setObjectName("map_view")
+        self.gridLayout.addWidget(self.map_view, 1, 0, 1, 3)
+
+        self.retranslateUi(MapPreviewDialog)
+        QtCore.QMetaObject.connectSlotsByName(MapPreviewDialog)
+
+    def retranslateUi(self, MapPreviewDialog):
+        _translate = QtCore.QCoreApplication.translate
+        MapPreviewDialog.setWindowTitle(_translate("MapPreviewDialog", "Map Preview"))
+        self.label.setText(_translate("MapPreviewDialog", "Map layout offset:"))
+        self.load_map_btn.setText(_translate("MapPreviewDialog", "Load map"))
+
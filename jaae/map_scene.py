@@ -0,0 +1,174 @@
+import numpy
+from PyQt5 import QtCore, QtGui
+
+from . import qmapview
+from . import gba_image
+from . import map_layout
+from .tilemap_scene import TilemapScene
+from .animation_player import TICK_INTERVAL, get_gba_timer, get_frame_index
+
+
+def indices_to_pixmap(indices, color_table):
+    h, w = indices.shape
+    image = QtGui.QImage(indices.data, w, h, w, QtGui.QImage.Format_Indexed8)
+    image.setColorTable(color_table)
+    # fromImage copies the pixels, so indices doesn't need to outlive the image
+    return QtGui.QPixmap.fromImage(image)
+
+
+class MapScene(TilemapScene):
+    """
+    Draws a map layout and plays the animations of the loaded tileset on it.
+    The map is drawn once to a pixmap, and the cells with animated tiles are
+    drawn again over it from a tile atlas. When the frame of an animation
+    changes only its tiles are copied to the atlas
+    """
+    def __init__(self, handler, zoom=1):
+        super(MapScene, self).__init__(8, zoom=zoom)
+        self.handler = handler
+        self.map_layout = None
+        self.tile_base = None
+        self.layers = None
+        self.atlas = None
+        self.atlas_color_table = None
+        self.animated_cells = None
+        self.animations_key = None
+        # Palettes of the map used with the tiles of every animation, and its frame in the atlas
+        self.animation_palettes = []
+        self.shown_frames = []
+        # Frame pixmaps, laid out like the atlas, by (frame sheet, start column, palette)
+        self.frame_pixmaps = {}
+
+        self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.setInterval(TICK_INTERVAL)
+        self.timer.timeout.connect(self.tick)
+        self.clock = QtCore.QElapsedTimer()
+
+    def set_map_layout(self, layout):
+        self.map_layout = layout
+        self.tile_base = self.handler.get_tileset_tile_base(layout)
+        self.layers = layout.get_tile_layers()
+        self.set_pixmap(indices_to_pixmap(layout.get_indices(), layout.get_color_table()))
+        self.atlas_color_table = layout.get_color_table(transparent=True)
+        self.frame_pixmaps = {}
+        self.update_animated_cells()
+
+    def start(self):
+        self.clock.start()
+        self.timer.start()
+        self.tick()
+
+    def stop(self):
+        self.timer.stop()
+
+    def get_fragments(self, entries, xs, ys):
+        """Fragments of the atlas that draw the tile entries at the cells (xs, ys)"""
+        numbers = entries & map_layout.TILE_NUMBER_MASK
+        # The two flip bits select the copy of the tile in the band
+        source_xs = ((entries >> map_layout.HFLIP_BIT) & 3) * map_layout.ATLAS_BAND_WIDTH + \
+            (numbers % map_layout.ATLAS_TILES_WIDE) * 8
+        source_ys = (entries >> map_layout.PALETTE_SHIFT) * map_layout.ATLAS_BAND_HEIGHT + \
+            (numbers // map_layout.ATLAS_TILES_WIDE) * 8
+        return [
+            QtGui.QPainter.PixmapFragment.create(
+                QtCore.QPointF(x * 8 + 4, y * 8 + 4), QtCore.QRectF(source_x, source_y, 8, 8)
+            )
+            for x, y, source_x, source_y in zip(
+                xs.tolist(), ys.tolist(), source_xs.tolist(), source_ys.tolist()
+            )
+        ]
+
+    def update_animated_cells(self):
+        """
+        Finds the cells that use the tiles of the animations, and draws them
+        over the map from a new atlas
+        """
+        if self.animated_cells is not None:
+            self.removeItem(self.animated_cells)
+            self.animated_cells = None
+        animations = self.handler.get_animations()
+        self.animations_key = [(animation.start_tile, animation.end_tile) for animation in animations]
+        self.animation_palettes = []
+        self.shown_frames = [None] * len(animations)
+        if self.map_layout is None or self.tile_base is None or not animations:
+            return
+
+        bottom, top = self.layers
+        numbers = (bottom & map_layout.TILE_NUMBER_MASK, top & map_layout.TILE_NUMBER_MASK)
+        animated = numpy.zeros(bottom.shape, dtype=bool)
+        for animation in animations:
+            first = self.tile_base + animation.start_tile
+            last = self.tile_base + animation.end_tile
+            palettes = set()
+            for layer, layer_numbers in zip(self.layers, numbers):
+                in_range = (layer_numbers >= first) & (layer_numbers <= last)
+                animated |= in_range
+                palettes.update((layer[in_range] >> map_layout.PALETTE_SHIFT).tolist())
+            self.animation_palettes.append(sorted(palettes))
+
+        ys, xs = numpy.nonzero(animated)
+        if len(ys) == 0:
+            return
+        self.atlas = indices_to_pixmap(self.map_layout.get_atlas_indices(), self.atlas_color_table)
+        rects = [QtCore.QRect(x * 8, y * 8, 8, 8) for x, y in zip(xs.tolist(), ys.tolist())]
+        # The top layer is drawn after the bottom one
+        fragments = self.get_fragments(bottom[ys, xs], xs, ys) + \
+            self.get_fragments(top[ys, xs], xs, ys)
+        backdrop = QtGui.QColor.fromRgba(self.atlas_color_table[0] | 0xff000000)
+        self.animated_cells = qmapview.QAnimatedCells(self.atlas, backdrop, rects, fragments)
+        self.addItem(self.animated_cells)
+
+    def get_frame_pixmap(self, sheet, column, palette):
+        key = (sheet, column, palette)
+        pixmap = self.frame_pixmaps.get(key)
+        if pixmap is None:
+            padded = gba_image.TileSheet(bytes(column * 32) + bytes(sheet))
+            indices = map_layout.get_flipped_tiles(padded.get_indices(map_layout.ATLAS_TILES_WIDE))
+            pixmap = indices_to_pixmap(indices + (palette << 4), self.atlas_color_table)
+            self.frame_pixmaps[key] = pixmap
+        return pixmap
+
+    def upload_frame(self, animation, sheet, palettes):
+        """Copies the tiles of the frame to the atlas, with every palette and flip used"""
+        first = self.tile_base + animation.start_tile
+        last = self.tile_base + animation.end_tile
+        rects = self.get_tiles_rects(first, last, map_layout.ATLAS_TILES_WIDE)
+        column = first % map_layout.ATLAS_TILES_WIDE
+        row_y = (first // map_layout.ATLAS_TILES_WIDE) * 8
+
+        painter = QtGui.QPainter(self.atlas)
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+        for palette in palettes:
+            band_y = palette * map_layout.ATLAS_BAND_HEIGHT
+            region = QtGui.QRegion()
+            for flip in range(4):
+                for rect in rects:
+                    region = region.united(rect.translated(flip * map_layout.ATLAS_BAND_WIDTH, band_y))
+            painter.setClipRegion(region)
+            painter.drawPixmap(0, band_y + row_y, self.get_frame_pixmap(sheet, column, palette))
+        painter.end()
+
+    def tick(self):
+        animations = self.handler.get_animations()
+        if [(animation.start_tile, animation.end_tile) for animation in animations] != \
+                self.animations_key:
+            self.update_animated_cells()
+        if self.animated_cells is None:
+            return
+
+        timer = get_gba_timer(self.clock.elapsed())
+        changed = False
+        for i, animation in enumerate(animations):
+            index = get_frame_index(timer, animation.speed, animation.get_frame_count())
+            sheet = self.handler.get_frame_sheet(animation.frames[index])
+            if sheet is not None and sheet is not self.shown_frames[i]:
+                self.upload_frame(animation, sheet, self.animation_palettes[i])
+                self.shown_frames[i] = sheet
+                changed = True
+        if changed:
+            self.animated_cells.update()
+
+    def clear(self):
+        self.animated_cells = None
+        super(MapScene, self).clear()
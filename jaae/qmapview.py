@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 
 
 class QMapPixmap(QtWidgets.QGraphicsObject):
@@ -10,14 +10,23 @@ class QMapPixmap(QtWidgets.QGraphicsObject):
 
     def __init__(self, pixmap):
         super(QMapPixmap, self).__init__()
+        self.pixmap = None
         self.set_pixmap(pixmap)
         self.button = None
+        # Makes option.exposedRect hold the part that really has to be painted
+        self.setFlag(QtWidgets.QGraphicsItem.ItemUsesExtendedStyleOption)
+        # Qt keeps what's painted at the zoom of each view, in QPixmapCache and
+        # within its limit, so the pixmap is only scaled again when zooming
+        self.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
 
     def boundingRect(self):
         return QtCore.QRectF(self.pixmap.rect())
 
     def set_pixmap(self, pixmap):
+        if self.pixmap is not None and self.pixmap.size() != pixmap.size():
+            self.prepareGeometryChange()
         self.pixmap = pixmap
+        self.update()
 
     def mousePressEvent(self, event):
         self.button = event.button()
@@ -33,5 +42,132 @@ class QMapPixmap(QtWidgets.QGraphicsObject):
         self.button = None
 
     def paint(self, painter, option, widget):
-        painter.drawPixmap(QtCore.QPoint(0, 0), self.pixmap)
+        # Only the exposed part of the pixmap is drawn
+        rect = option.exposedRect.toAlignedRect().intersected(self.pixmap.rect())
+        if rect.isEmpty():
+            return
+        painter.drawPixmap(rect, self.pixmap, rect)
 
+
+class QTileSelection(QtWidgets.QGraphicsItem):
+    def __init__(self):
+        super(QTileSelection, self).__init__()
+        self.rects = []
+        self.color = None
+        self.fill = False
+        self.bounding_rect = QtCore.QRectF()
+        # Clicks go through to the pixmap under it
+        self.setAcceptedMouseButtons(QtCore.Qt.NoButton)
+        self.setZValue(1)
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def get_region(self):
+        region = QtGui.QRegion()
+        for rect in self.rects:
+            region = region.united(rect)
+        return region
+
+    def set_rects(self, rects, color=None, fill=False, clip_rect=None):
+        """
+        clip_rect keeps the pen from going past the pixmap. It's also used as
+        the bounding rect, so that when the selection changes only the tiles
+        that changed are repainted
+        """
+        old_region = self.get_region()
+        self.rects = rects
+        if clip_rect is not None:
+            bounding_rect = QtCore.QRectF(clip_rect)
+        else:
+            bounding_rect = QtCore.QRectF()
+            for rect in rects:
+                # The pen is drawn one pixel past the rectangle
+                bounding_rect = bounding_rect.united(QtCore.QRectF(rect).adjusted(0, 0, 1, 1))
+
+        if bounding_rect != self.bounding_rect:
+            self.prepareGeometryChange()
+            self.bounding_rect = bounding_rect
+            self.update()
+        elif color != self.color or fill != self.fill:
+            self.update()
+        else:
+            for rect in old_region.xored(self.get_region()).rects():
+                # Grown by a pixel to include the outline
+                self.update(QtCore.QRectF(rect).adjusted(-1, -1, 1, 1))
+        self.color = color
+        self.fill = fill
+
+    def paint(self, painter, option, widget):
+        if not self.rects:
+            return
+        painter.setClipRect(self.bounding_rect)
+        # A cosmetic pen is one pixel wide at every zoom level
+        pen = QtGui.QPen(self.color)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        if self.fill:
+            painter.setBrush(self.color)
+        for rect in self.rects:
+            painter.drawRect(rect)
+
+
+class QAnimatedTiles(QtWidgets.QGraphicsItem):
+    """
+    Draws a frame of an animation over the tiles it replaces.
+    The frame pixmaps start at the left of the row at y, and only the part
+    inside rects is drawn
+    """
+    def __init__(self, rects, y):
+        super(QAnimatedTiles, self).__init__()
+        self.region = QtGui.QRegion()
+        bounding_rect = QtCore.QRectF()
+        for rect in rects:
+            self.region = self.region.united(rect)
+            bounding_rect = bounding_rect.united(QtCore.QRectF(rect))
+        self.bounding_rect = bounding_rect
+        self.y = y
+        self.pixmap = None
+        self.setAcceptedMouseButtons(QtCore.Qt.NoButton)
+        # Over the tileset, under the selection
+        self.setZValue(0.5)
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def set_pixmap(self, pixmap):
+        if pixmap is not self.pixmap:
+            self.pixmap = pixmap
+            self.update()
+
+    def paint(self, painter, option, widget):
+        if self.pixmap is None:
+            return
+        painter.setClipRegion(self.region)
+        painter.drawPixmap(QtCore.QPoint(0, self.y), self.pixmap)
+
+
+class QAnimatedCells(QtWidgets.QGraphicsItem):
+    """
+    Draws some 8x8 cells of a map again, over its pixmap: the backdrop color
+    and then the fragments of the tile atlas that cover them
+    """
+    def __init__(self, atlas, backdrop, rects, fragments):
+        super(QAnimatedCells, self).__init__()
+        self.atlas = atlas
+        self.backdrop = backdrop
+        self.fragments = fragments
+        # The cells come sorted by row, as setRects needs them
+        self.region = QtGui.QRegion()
+        self.region.setRects(rects)
+        self.bounding_rect = QtCore.QRectF(self.region.boundingRect())
+        self.setAcceptedMouseButtons(QtCore.Qt.NoButton)
+        self.setZValue(0.5)
+
+    def boundingRect(self):
+        return self.bounding_rect
+
+    def paint(self, painter, option, widget):
+        painter.setClipRegion(self.region)
+        painter.fillRect(self.bounding_rect, self.backdrop)
+        painter.drawPixmapFragments(self.fragments, self.atlas)
@@ -0,0 +1,100 @@
+import os
+import mmap
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# The ROM of a worker process of make_rom_pool(), mapped once in each one
+_worker_rom = None
+
+
+def _init_worker_rom(filename):
+    global _worker_rom
+    with open(filename, 'rb') as f:
+        _worker_rom = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def make_rom_pool(filename, processes):
+    """
+    Returns a ProcessPoolExecutor whose workers have the ROM mapped, which
+    the functions they run get with get_worker_rom()
+    """
+    return ProcessPoolExecutor(processes, initializer=_init_worker_rom, initargs=(filename,))
+
+
+def get_worker_rom():
+    return _worker_rom
+
+
+class RomImage:
+    """
+    A ROM file mapped to memory. It's mapped again only when the file changes
+    on disk, which is noticed by its modification time and size.
+    Slices are memoryviews of the mapping: they have to be copied with bytes()
+    to be kept, the mapping goes away with refresh() or close(). Other
+    threads have to hold lock while they read, it's held while the mapping
+    changes
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.map = None
+        self.data = memoryview(b'')
+        self.file_stat = None
+        self.lock = threading.RLock()
+        self.open()
+
+    def get_file_stat(self):
+        stat = os.stat(self.filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    def open(self):
+        with self.lock:
+            self.close()
+            self.file_stat = self.get_file_stat()
+            if self.file_stat[1] > 0:
+                with open(self.filename, 'rb') as f:
+                    self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.data = memoryview(self.map)
+
+    def close(self):
+        with self.lock:
+            # A closed image is always stale, refresh() opens it again
+            self.file_stat = None
+            self.data.release()
+            self.data = memoryview(b'')
+            if self.map is not None:
+                try:
+                    self.map.close()
+                except BufferError:
+                    # A slice is still alive, the memory is unmapped along with it
+                    pass
+                self.map = None
+
+    def get_identity(self):
+        """Changes whenever the ROM is mapped from a different file or the file changed"""
+        return self.filename, self.file_stat
+
+    def is_stale(self):
+        try:
+            return self.get_file_stat() != self.file_stat
+        except OSError:
+            return True
+
+    def refresh(self):
+        """Maps the file again if it changed. Returns whether it did"""
+        with self.lock:
+            if self.is_stale():
+                self.open()
+                return True
+            return False
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def read_u32(self, offset):
+        return int.from_bytes(self.data[offset:offset + 4], 'little')
+
+    def read_pointer(self, offset):
+        return self.read_u32(offset) & 0x7ffffff
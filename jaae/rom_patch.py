@@ -0,0 +1,202 @@
+import bisect
+import zlib
+
+import numpy
+
+IPS_HEADER = b'PATCH'
+IPS_FOOTER = b'EOF'
+# A record at this offset would read as the footer
+IPS_EOF_OFFSET = 0x454f46
+IPS_MAX_OFFSET = 0xffffff
+IPS_MAX_RECORD_SIZE = 0xffff
+# Shorter runs of a byte take less space as plain data
+IPS_MIN_RLE_SIZE = 16
+UPS_HEADER = b'UPS1'
+
+
+class PatchError(Exception):
+    pass
+
+
+def get_runs(mask):
+    """Returns the (start, end) pairs of the runs of True in mask"""
+    edges = numpy.diff(mask.view(numpy.int8), prepend=numpy.int8(0), append=numpy.int8(0))
+    return zip(numpy.flatnonzero(edges == 1).tolist(), numpy.flatnonzero(edges == -1).tolist())
+
+
+def encode_ups_number(value):
+    """The variable length numbers of UPS patches"""
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value == 0:
+            encoded.append(byte | 0x80)
+            return bytes(encoded)
+        encoded.append(byte)
+        value -= 1
+
+
+class ChangeSet:
+    """
+    Writes to a ROM collected in memory instead of made to the file. From
+    them it gives the ranges of bytes that actually change, which is all
+    that has to be written, or a patch of the ROM. Writes past the end grow
+    the ROM with fill.
+    original is read when the changes are asked for, so it has to stay
+    the same until then
+    """
+    def __init__(self, original, fill=0xff):
+        self.original = original
+        self.fill = fill
+        self.writes = []
+
+    def write(self, offset, data):
+        self.writes.append((offset, bytes(data)))
+
+    def get_original_size(self):
+        return len(self.original)
+
+    def get_size(self):
+        return max([self.get_original_size()] + [offset + len(data) for offset, data in self.writes])
+
+    def get_changes(self):
+        """
+        Returns sorted and separate (offset, data) ranges with the bytes that
+        differ from the ROM, later writes winning over earlier ones. All the
+        bytes the ROM grows by are changes
+        """
+        original_size = self.get_original_size()
+        writes = list(self.writes)
+        size = self.get_size()
+        if size > original_size:
+            writes.insert(0, (original_size, bytes([self.fill]) * (size - original_size)))
+
+        # The writes that overlap or touch are put together in spans
+        spans = []
+        for offset, data in sorted(writes, key=lambda write: write[0]):
+            end = offset + len(data)
+            if spans and offset <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], end)
+            elif data:
+                spans.append([offset, end])
+        starts = [start for start, _ in spans]
+        buffers = [
+            bytearray(self.original[start:min(end, original_size)]) + bytes(max(end - max(start, original_size), 0))
+            for start, end in spans
+        ]
+        for offset, data in writes:
+            if data:
+                i = bisect.bisect_right(starts, offset) - 1
+                position = offset - starts[i]
+                buffers[i][position:position + len(data)] = data
+
+        changes = []
+        for (start, end), buffer in zip(spans, buffers):
+            new = numpy.frombuffer(buffer, dtype=numpy.uint8)
+            changed = numpy.ones(len(new), dtype=bool)
+            kept = min(end, original_size) - start
+            if kept > 0:
+                changed[:kept] = new[:kept] != numpy.frombuffer(self.original[start:start + kept], dtype=numpy.uint8)
+            for run_start, run_end in get_runs(changed):
+                changes.append((start + run_start, bytes(buffer[run_start:run_end])))
+        return changes
+
+    def apply(self, contents):
+        """Writes the changes to contents, a writable buffer as big as get_size()"""
+        for offset, data in self.get_changes():
+            contents[offset:offset + len(data)] = data
+
+    def make_ips(self):
+        patch = bytearray(IPS_HEADER)
+        for offset, data in self.get_changes():
+            if offset + len(data) - 1 > IPS_MAX_OFFSET:
+                raise PatchError("IPS patches can't change the ROM past 16 MiB, a UPS patch can.")
+            # Long runs of the same byte go in RLE records, and the rest in plain ones
+            values = numpy.frombuffer(data, dtype=numpy.uint8)
+            same = numpy.concatenate(([False], values[1:] == values[:-1]))
+            # The byte before the change is never changed
+            previous = self.original[offset - 1] if offset > 0 else 0
+            position = 0
+            for run_start, run_end in get_runs(same):
+                # The run starts at the byte before the first repeated one
+                run_start -= 1
+                if run_end - run_start >= IPS_MIN_RLE_SIZE:
+                    if position < run_start:
+                        self.add_ips_records(patch, offset + position, data[position:run_start], previous)
+                    self.add_ips_rle_records(
+                        patch, offset + run_start, data[run_start], run_end - run_start,
+                        data[run_start - 1] if run_start > 0 else previous
+                    )
+                    position = run_end
+                    previous = data[run_end - 1]
+            if position < len(data):
+                self.add_ips_records(patch, offset + position, data[position:], previous)
+        patch += IPS_FOOTER
+        return bytes(patch)
+
+    def add_ips_records(self, patch, offset, data, previous):
+        """previous is the new value of the byte before offset"""
+        while data:
+            if offset == IPS_EOF_OFFSET:
+                # Starting a byte earlier, writing the byte before again
+                offset -= 1
+                data = bytes([previous]) + data
+            record = data[:IPS_MAX_RECORD_SIZE]
+            patch += offset.to_bytes(3, 'big') + len(record).to_bytes(2, 'big') + record
+            offset += len(record)
+            data = data[len(record):]
+            previous = record[-1]
+
+    def add_ips_rle_records(self, patch, offset, value, count, previous):
+        """previous is the new value of the byte before offset"""
+        while count > 0:
+            if offset == IPS_EOF_OFFSET:
+                # This byte goes in a plain record, which can start earlier
+                self.add_ips_records(patch, offset, bytes([value]), previous)
+                offset += 1
+                count -= 1
+                previous = value
+                continue
+            record_count = min(count, IPS_MAX_RECORD_SIZE)
+            patch += offset.to_bytes(3, 'big') + bytes(2) + record_count.to_bytes(2, 'big') + bytes([value])
+            offset += record_count
+            count -= record_count
+            previous = value
+
+    def iter_target(self):
+        """The bytes of the ROM with the changes made, in pieces"""
+        original_size = self.get_original_size()
+        position = 0
+        for offset, data in self.get_changes():
+            if position < offset:
+                yield self.original[position:offset]
+            yield data
+            position = offset + len(data)
+        if position < original_size:
+            yield self.original[position:original_size]
+
+    def make_ups(self):
+        original_size = self.get_original_size()
+        patch = bytearray(UPS_HEADER)
+        patch += encode_ups_number(original_size)
+        patch += encode_ups_number(self.get_size())
+        position = 0
+        for offset, data in self.get_changes():
+            # Past the end of the ROM the bytes are XORed with zeros
+            kept = max(min(len(data), original_size - offset), 0)
+            xor = numpy.frombuffer(data, dtype=numpy.uint8).copy()
+            xor[:kept] ^= numpy.frombuffer(self.original[offset:offset + kept], dtype=numpy.uint8)
+            # Every run of XORed bytes ends with a zero, which also skips a byte
+            for run_start, run_end in get_runs(xor != 0):
+                patch += encode_ups_number(offset + run_start - position)
+                patch += xor[run_start:run_end].tobytes() + b'\0'
+                position = offset + run_end + 1
+
+        target_crc = 0
+        for piece in self.iter_target():
+            target_crc = zlib.crc32(piece, target_crc)
+        patch += zlib.crc32(self.original[:]).to_bytes(4, 'little')
+        patch += target_crc.to_bytes(4, 'little')
+        patch += zlib.crc32(patch).to_bytes(4, 'little')
+        return bytes(patch)
@@ -1,27 +1,78 @@
 
+import numpy
 from PyQt5 import QtWidgets, QtGui, QtCore
-from PIL import ImageQt
 
 from . import qmapview
+from . import gba_image
+
+
+ZOOM_LEVELS = (1, 2, 4, 8)
 
 
 class TilemapScene(QtWidgets.QGraphicsScene):
-    def __init__(self, tile_size, img=None, clicked_event=None, clicked_dragged_event=None):
+    def __init__(self, tile_size, clicked_event=None, clicked_dragged_event=None, zoom=1):
         super(TilemapScene, self).__init__()
 
         self.pixmap = None
+        self.selection = None
+        self.animated_tiles = []
+        self.tilesheet_key = None
+        self.tilesheet_indices = None
+        self.tilesheet_image = None
+        self.tilesheet_palette = None
+        self.tilesheet_pixmap = None
         self.tiles_wide = None
         self.tile_size = tile_size
         self.clicked_event = clicked_event
         self.clicked_dragged_event = clicked_dragged_event
-
-        if img is not None:
-            self.set_image(img)
-
-    def set_image(self, img):
-        img_qt = ImageQt.ImageQt(img.convert('RGBA'))
-        pixmap = QtGui.QPixmap.fromImage(img_qt)
-        self.set_pixmap(pixmap)
+        self.zoom = zoom
+
+        # Drags are sent to clicked_dragged_event at most once per frame,
+        # and only when the tile under the cursor changes
+        self.drag_timer = QtCore.QTimer()
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.timeout.connect(self.flush_drag)
+        self.pending_drag = None
+        self.last_drag = None
+
+    def set_tilesheet(self, tilesheet, tiles_wide, palette):
+        """palette is a 16-color palette in GBA format"""
+        # The indexed image is only generated again if the pixels changed,
+        # changing the palette just swaps its color table
+        key = (tilesheet, tiles_wide)
+        if key == self.tilesheet_key and palette == self.tilesheet_palette and \
+                self.pixmap is not None:
+            return
+        if key != self.tilesheet_key:
+            indices = tilesheet.get_indices(tiles_wide)
+            h, w = indices.shape
+            # The image uses the array's memory, so it has to be kept alive
+            self.tilesheet_indices = numpy.require(indices, requirements=('C', 'W'))
+            self.tilesheet_image = QtGui.QImage(
+                self.tilesheet_indices.data, w, h, w, QtGui.QImage.Format_Indexed8
+            )
+            self.tilesheet_key = key
+            self.tilesheet_palette = None
+        if palette != self.tilesheet_palette:
+            self.tilesheet_image.setColorTable(gba_image.get_palette_lut(palette, 'ARGB32').tolist())
+            self.tilesheet_pixmap = QtGui.QPixmap.fromImage(self.tilesheet_image)
+            self.tilesheet_palette = palette
+        self.set_pixmap(self.tilesheet_pixmap)
+
+    def set_zoom(self, zoom):
+        """Zooms every view of the scene, the scene itself stays at 1x"""
+        self.zoom = zoom
+        for view in self.views():
+            view.setTransform(QtGui.QTransform.fromScale(zoom, zoom))
+
+    def wheelEvent(self, event):
+        if event.modifiers() & QtCore.Qt.ControlModifier:
+            index = ZOOM_LEVELS.index(self.zoom) + (1 if event.delta() > 0 else -1)
+            if 0 <= index < len(ZOOM_LEVELS):
+                self.set_zoom(ZOOM_LEVELS[index])
+            event.accept()
+        else:
+            super(TilemapScene, self).wheelEvent(event)
 
     def set_pixmap(self, pixmap):
         if self.pixmap is None or pixmap.width() != self.pixmap.pixmap.width():
@@ -29,7 +80,6 @@ class TilemapScene(QtWidgets.QGraphicsScene):
         else:
             self.pixmap.set_pixmap(pixmap)
         self.tiles_wide = pixmap.width() // self.tile_size
-        self.update()
 
     def initialize_pixmap(self, pixmap):
         self.clear()
@@ -38,7 +88,39 @@ class TilemapScene(QtWidgets.QGraphicsScene):
         if self.clicked_event is not None:
             self.pixmap.clicked.connect(self.clicked_event)
         if self.clicked_dragged_event is not None:
-            self.pixmap.click_dragged.connect(self.clicked_dragged_event)
+            self.pixmap.clicked.connect(self.start_drag)
+            self.pixmap.click_dragged.connect(self.queue_drag)
+            self.pixmap.click_release.connect(self.flush_drag)
+
+    @staticmethod
+    def get_drag_interval():
+        """Milliseconds between two frames of the screen"""
+        screen = QtGui.QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 0
+        if refresh_rate <= 0:
+            refresh_rate = 60
+        return max(1, int(1000 / refresh_rate))
+
+    def start_drag(self, event):
+        self.drag_timer.stop()
+        self.pending_drag = None
+        self.last_drag = (self.get_clicked_tile(event), event.button())
+
+    def queue_drag(self, event):
+        # The event can't be kept, only what's needed from it
+        self.pending_drag = (self.get_clicked_tile(event), event.button())
+        if not self.drag_timer.isActive():
+            self.drag_timer.start(self.get_drag_interval())
+
+    def flush_drag(self, event=None):
+        self.drag_timer.stop()
+        if self.pending_drag is None:
+            return
+        tile_num, button = self.pending_drag
+        self.pending_drag = None
+        if tile_num != -1 and (tile_num, button) != self.last_drag:
+            self.last_drag = (tile_num, button)
+            self.clicked_dragged_event(tile_num, button)
 
     def get_clicked_tile(self, event):
         pos = event.pos()
@@ -53,43 +135,77 @@ class TilemapScene(QtWidgets.QGraphicsScene):
 
         return tile_num
 
-    def draw_square_over_tile(self, tile_num, color=QtCore.Qt.blue):
-        x = (tile_num % self.tiles_wide) * self.tile_size
-        y = (tile_num // self.tiles_wide) * self.tile_size
-
-        drawer = QtGui.QPainter(self.pixmap.pixmap)
-        drawer.setPen(color)
-        drawer.drawRect(x, y, self.tile_size, self.tile_size)
-        drawer.end()
-
-    def draw_rectangle_over_tiles(self, start_tile, end_tile, color=QtCore.Qt.blue, fill=False):
-        total_tiles_to_paint = end_tile - start_tile + 1
-        start_tile_x = start_tile % self.tiles_wide
-        y = (start_tile // self.tiles_wide) * self.tile_size
-        drawer = QtGui.QPainter(self.pixmap.pixmap)
-        drawer.setPen(color)
-        if fill:
-            drawer.setBrush(color)
+    def get_tiles_rects(self, start_tile, end_tile, tiles_wide=None):
+        """
+        Returns the rectangles that cover the tiles from start_tile to end_tile:
+        the end of the first row, the full rows and the start of the last row.
+        tiles_wide defaults to the width of the pixmap
+        """
+        if tiles_wide is None:
+            tiles_wide = self.tiles_wide
+        rects = []
+        total_tiles = end_tile - start_tile + 1
+        start_tile_x = start_tile % tiles_wide
+        y = (start_tile // tiles_wide) * self.tile_size
 
         if start_tile_x != 0:
-            x = start_tile_x * self.tile_size
-            tiles_to_paint = self.tiles_wide - start_tile_x
-            if total_tiles_to_paint < tiles_to_paint:
-                tiles_to_paint = total_tiles_to_paint
-            drawer.drawRect(x, y, self.tile_size * tiles_to_paint, self.tile_size)
-            total_tiles_to_paint -= tiles_to_paint
+            tiles = min(tiles_wide - start_tile_x, total_tiles)
+            rects.append(QtCore.QRect(
+                start_tile_x * self.tile_size, y, self.tile_size * tiles, self.tile_size
+            ))
+            total_tiles -= tiles
             y += self.tile_size
 
-        for i in range(total_tiles_to_paint // self.tiles_wide):
-            drawer.drawRect(0, y, self.tile_size * self.tiles_wide, self.tile_size)
-            y += self.tile_size
-            total_tiles_to_paint -= self.tiles_wide
-
-        if total_tiles_to_paint > 0:
-            drawer.drawRect(0, y, self.tile_size * total_tiles_to_paint, self.tile_size)
-
-        drawer.end()
+        full_rows = total_tiles // tiles_wide
+        if full_rows > 0:
+            rects.append(QtCore.QRect(
+                0, y, self.tile_size * tiles_wide, self.tile_size * full_rows
+            ))
+            y += self.tile_size * full_rows
+            total_tiles -= tiles_wide * full_rows
+
+        if total_tiles > 0:
+            rects.append(QtCore.QRect(0, y, self.tile_size * total_tiles, self.tile_size))
+        return rects
+
+    def set_selection(self, start_tile, end_tile, color=QtCore.Qt.blue, fill=False):
+        """
+        Highlights the tiles with an item over the pixmap, so changing the
+        selection doesn't touch the pixmap
+        """
+        if self.pixmap is None:
+            return
+        if self.selection is None:
+            self.selection = qmapview.QTileSelection()
+            self.addItem(self.selection)
+        self.selection.set_rects(
+            self.get_tiles_rects(start_tile, end_tile), color, fill, self.pixmap.pixmap.rect()
+        )
+
+    def add_animated_tiles(self, start_tile, end_tile):
+        """
+        Adds an item that draws animation frames over the tiles from
+        start_tile to end_tile, and returns it
+        """
+        item = qmapview.QAnimatedTiles(
+            self.get_tiles_rects(start_tile, end_tile),
+            (start_tile // self.tiles_wide) * self.tile_size
+        )
+        self.addItem(item)
+        self.animated_tiles.append(item)
+        return item
+
+    def clear_animated_tiles(self):
+        for item in self.animated_tiles:
+            self.removeItem(item)
+        self.animated_tiles = []
+
+    def clear_selection(self):
+        if self.selection is not None:
+            self.selection.set_rects([])
 
     def clear(self):
         self.pixmap = None
+        self.selection = None
+        self.animated_tiles = []
         super(TilemapScene, self).clear()
\ No newline at end of file
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+
+from . import lz77
+from .rom_image import make_rom_pool, get_worker_rom
+
+TILESET_HEADER_SIZE = 24
+MAX_TILESETS = 256
+# What load_tileset reads of an uncompressed tileset
+UNCOMPRESSED_TILE_COUNT = 512
+# Tiles decoded for the thumbnail of every tileset
+THUMBNAIL_TILES = 128
+TASKS_PER_PROCESS = 4
+# Reading a compressed tileset takes about 2.5 ms, starting a process and
+# mapping the ROM in it costs about as much as reading this many of them
+MIN_TASKS_PER_PROCESS = 8
+# Where the tileset headers keep the pointer to their animation routine
+CALLBACK_POINTER_OFFSETS = {
+    'BPEE': 0x14,
+    'BPRE': 0x10,
+    'AXVE': 0x14
+}
+# First instructions of the routine JAAE inserts, prepareTilesetCB in
+# resources/base_routines.s. None stands for "ldr r1, =..." whose offset
+# depends on the literal pool
+JAAE_ROUTINE_SIGNATURE = (None, 0x2000, 0x8008, None, 0x2001, 0x03c0, 0x8008)
+LDR_R1_PC = 0x49
+
+
+class TilesetInfo:
+    def __init__(self, number, header_offset, is_compressed, is_primary, image_offset,
+                 palettes_offset, tile_count=None, routine_offset=None, has_jaae_routine=False,
+                 thumbnail_data=b'', palettes_data=b''):
+        self.number = number
+        self.header_offset = header_offset
+        self.is_compressed = is_compressed
+        self.is_primary = is_primary
+        self.image_offset = image_offset
+        self.palettes_offset = palettes_offset
+        # None when the compressed image isn't valid
+        self.tile_count = tile_count
+        self.routine_offset = routine_offset
+        self.has_jaae_routine = has_jaae_routine
+        # The first THUMBNAIL_TILES tiles, in 4bpp, and the 16 palettes
+        self.thumbnail_data = thumbnail_data
+        self.palettes_data = palettes_data
+
+
+def read_u32(data, offset):
+    return int.from_bytes(data[offset:offset + 4], 'little')
+
+
+def is_rom_pointer(value, rom_size):
+    return 0x8000000 <= value < 0x8000000 + rom_size
+
+
+def is_tileset_header(data, offset):
+    if len(data) < offset + TILESET_HEADER_SIZE:
+        return False
+    # The compressed and secondary flags are booleans
+    if data[offset] > 1 or data[offset + 1] > 1:
+        return False
+    # Image, palettes and metatiles
+    return all(is_rom_pointer(read_u32(data, offset + i), len(data)) for i in (4, 8, 12))
+
+
+def find_tileset_headers(data, table_offset):
+    """
+    Walks the table of tileset headers of the game for as long as the entries
+    look like headers. Returns their offsets
+    """
+    offsets = []
+    for number in range(MAX_TILESETS):
+        offset = table_offset + number * TILESET_HEADER_SIZE
+        if not is_tileset_header(data, offset):
+            break
+        offsets.append(offset)
+    return offsets
+
+
+def is_jaae_routine(data, offset):
+    if len(data) < offset + 2 * len(JAAE_ROUTINE_SIGNATURE):
+        return False
+    for i, expected in enumerate(JAAE_ROUTINE_SIGNATURE):
+        halfword = int.from_bytes(data[offset + i * 2:offset + i * 2 + 2], 'little')
+        if expected is None:
+            if halfword >> 8 != LDR_R1_PC:
+                return False
+        elif halfword != expected:
+            return False
+    return True
+
+
+def read_tileset_info(data, number, header_offset, callback_pointer_offset):
+    is_compressed = data[header_offset] != 0
+    is_primary = data[header_offset + 1] == 0
+    image_offset = read_u32(data, header_offset + 4) & 0x7ffffff
+    palettes_offset = read_u32(data, header_offset + 8) & 0x7ffffff
+
+    view = memoryview(data)
+    try:
+        if is_compressed:
+            try:
+                _, size = lz77.validate(view[image_offset:])
+                tile_count = size // 32
+                thumbnail_data = lz77.decompress_head(view[image_offset:], THUMBNAIL_TILES * 32)
+            except lz77.InvalidLz77Data:
+                tile_count = None
+                thumbnail_data = b''
+        else:
+            tile_count = UNCOMPRESSED_TILE_COUNT
+            thumbnail_data = bytes(view[image_offset:image_offset + THUMBNAIL_TILES * 32])
+        palettes_data = bytes(view[palettes_offset:palettes_offset + 16 * 32])
+    finally:
+        view.release()
+
+    routine_pointer = read_u32(data, header_offset + callback_pointer_offset)
+    if is_rom_pointer(routine_pointer, len(data)):
+        # Thumb routines have the lowest bit set
+        routine_offset = routine_pointer & 0x7fffffe
+        has_jaae_routine = is_jaae_routine(data, routine_offset)
+    else:
+        routine_offset = None
+        has_jaae_routine = False
+
+    return TilesetInfo(
+        number, header_offset, is_compressed, is_primary, image_offset, palettes_offset,
+        tile_count, routine_offset, has_jaae_routine, thumbnail_data, palettes_data
+    )
+
+
+def _read_tileset_info_worker(args):
+    return read_tileset_info(get_worker_rom(), *args)
+
+
+def build_catalog(filename, table_offset, callback_pointer_offset, processes=None):
+    """
+    Reads every tileset of the table at table_offset, splitting the
+    decompression between processes (os.cpu_count() by default).
+    Returns a list of TilesetInfo
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        tasks = [
+            (number, header_offset, callback_pointer_offset)
+            for number, header_offset in enumerate(find_tileset_headers(data, table_offset))
+        ]
+        processes = min(processes, len(tasks) // MIN_TASKS_PER_PROCESS)
+        if processes <= 1:
+            return [read_tileset_info(data, *task) for task in tasks]
+    finally:
+        data.close()
+
+    chunk_size = -(-len(tasks) // (processes * TASKS_PER_PROCESS))
+    with make_rom_pool(filename, processes) as executor:
+        return list(executor.map(_read_tileset_info_worker, tasks, chunksize=chunk_size))
@@ -0,0 +1,129 @@
+from concurrent.futures import BrokenExecutor
+
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from .jaae_handler import JaaeError
+from . import main_window
+from . import gba_image
+from . import tileset_catalog
+from .tileset_catalog_ui import Ui_TilesetCatalogDialog
+
+
+THUMBNAIL_TILES_WIDE = 16
+# How often the dialog checks whether the catalog is ready, in ms
+CATALOG_POLL_INTERVAL = 50
+
+
+def make_tileset_thumbnail(info, palette_index):
+    if not info.thumbnail_data:
+        return QtGui.QIcon()
+    indices = gba_image.from_4bpp_to_indices(info.thumbnail_data, THUMBNAIL_TILES_WIDE)
+    h, w = indices.shape
+    image = QtGui.QImage(indices.data, w, h, w, QtGui.QImage.Format_Indexed8)
+    palette = info.palettes_data[palette_index * 32:(palette_index + 1) * 32]
+    image.setColorTable(gba_image.get_palette_lut(palette, 'ARGB32').tolist())
+    return QtGui.QIcon(QtGui.QPixmap.fromImage(image))
+
+
+class TilesetCatalogDialog(QtWidgets.QDialog):
+    """Lists every tileset of the ROM, the selected one ends in selected_header_offset"""
+    def __init__(self, handler):
+        QtWidgets.QDialog.__init__(self)
+        self.ui = Ui_TilesetCatalogDialog()
+        self.ui.setupUi(self)
+        icon = QtGui.QIcon()
+        icon.addPixmap(QtGui.QPixmap(main_window.ICON_PATH), QtGui.QIcon.Normal, QtGui.QIcon.Off)
+        self.setWindowIcon(icon)
+        self.handler = handler
+        self.catalog = []
+        self.catalog_future = None
+        self.selected_header_offset = None
+        self.catalog_timer = QtCore.QTimer(self)
+        self.catalog_timer.setInterval(CATALOG_POLL_INTERVAL)
+        self.catalog_timer.timeout.connect(self.check_catalog)
+
+        self.ui.catalog_lst.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.ui.catalog_lst.setIconSize(QtCore.QSize(
+            THUMBNAIL_TILES_WIDE * 8, tileset_catalog.THUMBNAIL_TILES // THUMBNAIL_TILES_WIDE * 8
+        ))
+        self.ui.catalog_lst.itemSelectionChanged.connect(self.catalog_selection_changed)
+        self.ui.catalog_lst.itemDoubleClicked.connect(self.select_tileset)
+        self.ui.select_btn.clicked.connect(self.select_tileset)
+        self.ui.select_btn.setEnabled(False)
+
+    def error_message(self, description):
+        QtWidgets.QMessageBox.critical(self, 'Error', description)
+
+    def start_loading_catalog(self):
+        """
+        Starts building the catalog in another thread, the list is filled
+        once it's done. Returns False if it couldn't be started
+        """
+        try:
+            self.catalog_future = self.handler.start_tileset_catalog()
+        except JaaeError as e:
+            self.error_message(str(e))
+            return False
+        self.ui.catalog_lst.addItem('Reading the tilesets...')
+        self.ui.catalog_lst.setEnabled(False)
+        self.catalog_timer.start()
+        return True
+
+    def check_catalog(self):
+        if not self.catalog_future.done():
+            return
+        self.catalog_timer.stop()
+        self.ui.catalog_lst.clear()
+        # Nothing can be let out of a timer slot, whatever went wrong in the
+        # thread or the processes ends the dialog
+        try:
+            self.catalog = self.catalog_future.result()
+        except (JaaeError, OSError) as e:
+            self.catalog_failed(str(e))
+            return
+        except BrokenExecutor:
+            self.catalog_failed('A process reading the tilesets stopped unexpectedly.')
+            return
+        except Exception as e:
+            self.catalog_failed('The tilesets couldn\'t be read: {0}'.format(e))
+            return
+        self.ui.catalog_lst.setEnabled(True)
+        self.fill_catalog_list()
+
+    def catalog_failed(self, description):
+        self.catalog = []
+        self.error_message(description)
+        self.reject()
+
+    def fill_catalog_list(self):
+        secondary_palette = self.handler.PRIMARY_PALETTES_COUNT[self.handler.rom_code]
+        for info in self.catalog:
+            description = ['Primary' if info.is_primary else 'Secondary']
+            description.append('compressed' if info.is_compressed else 'uncompressed')
+            if info.tile_count is None:
+                description.append('invalid image')
+            else:
+                description.append('{0} tiles'.format(info.tile_count))
+            if info.has_jaae_routine:
+                description.append('JAAE animations at {0}'.format(hex(info.routine_offset)))
+            item = QtWidgets.QListWidgetItem(
+                make_tileset_thumbnail(info, 0 if info.is_primary else secondary_palette),
+                '{0}: {1}\n{2}'.format(info.number, hex(info.header_offset), ', '.join(description))
+            )
+            self.ui.catalog_lst.addItem(item)
+
+    def exec(self):
+        if not self.start_loading_catalog():
+            return QtWidgets.QDialog.Rejected
+        result = QtWidgets.QDialog.exec(self)
+        self.catalog_timer.stop()
+        return result
+
+    def catalog_selection_changed(self):
+        self.ui.select_btn.setEnabled(len(self.ui.catalog_lst.selectedItems()) > 0)
+
+    def select_tileset(self):
+        row = self.ui.catalog_lst.currentRow()
+        if 0 <= row < len(self.catalog):
+            self.selected_header_offset = self.catalog[row].header_offset
+            self.accept()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file 'resources/tileset_catalog.ui'
+#
+# Created by: PyQt5 UI code generator 5.9
+#
+# WARNING! All changes made in this file will be lost!
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+class Ui_TilesetCatalogDialog(object):
+    def setupUi(self, TilesetCatalogDialog):
+        TilesetCatalogDialog.setObjectName("TilesetCatalogDialog")
+        TilesetCatalogDialog.resize(480, 520)
+        self.gridLayout = QtWidgets.QGridLayout(TilesetCatalogDialog)
+        self.gridLayout.setObjectName("gridLayout")
+        self.catalog_lst = QtWidgets.QListWidget(TilesetCatalogDialog)
+        self.catalog_lst.setObjectName("catalog_lst")
+        self.gridLayout.addWidget(self.catalog_lst, 0, 0, 1, 2)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.gridLayout.addItem(spacerItem, 1, 0, 1, 1)
+        self.select_btn = QtWidgets.QPushButton(TilesetCatalogDialog)
+        self.select_btn.setObjectName("select_btn")
+        self.gridLayout.addWidget(self.select_btn, 1, 1, 1, 1)
+
+        self.retranslateUi(TilesetCatalogDialog)
+        QtCore.QMetaObject.connectSlotsByName(TilesetCatalogDialog)
+
+    def retranslateUi(self, TilesetCatalogDialog):
+        _translate = QtCore.QCoreApplication.translate
+        TilesetCatalogDialog.setWindowTitle(_translate("TilesetCatalogDialog", "Tilesets"))
+        self.select_btn.setText(_translate("TilesetCatalogDialog", "Select tileset"))
+
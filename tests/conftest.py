@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from jaae import lz77
+from jaae.tileset_catalog import TILESET_HEADER_SIZE
+
+ROM_SIZE = 0x800000
+# Where Emerald keeps its tileset headers
+TILESET_TABLE_OFFSET = 0x3df704
+# The tileset graphics and palettes go from here on, the rest is free space
+DATA_OFFSET = 0x500000
+
+
+def make_tileset_data(rng, tile_count=512):
+    # Runs of a few colors, so it compresses like real graphics do
+    data = bytearray()
+    while len(data) < tile_count * 32:
+        data += bytes([rng.randrange(16) * 0x11]) * rng.randrange(1, 40)
+    return bytes(data[:tile_count * 32])
+
+
+def make_tileset_rom(filename, tileset_count=4, seed=7):
+    """
+    Writes an Emerald ROM with tileset_count tilesets in its table, the first
+    two primary. Every third one is uncompressed. Returns the header offsets
+    """
+    rng = random.Random(seed)
+    rom = bytearray(b'\xff' * ROM_SIZE)
+    rom[0xac:0xb0] = b'BPEE'
+    offset = DATA_OFFSET
+    headers = []
+    for number in range(tileset_count):
+        is_compressed = number % 3 != 2
+        data = make_tileset_data(rng)
+        if is_compressed:
+            data = lz77.compress(data)
+        image_offset = offset
+        rom[offset:offset + len(data)] = data
+        offset += len(data) + -len(data) % 4
+        palettes_offset = offset
+        rom[offset:offset + 16 * 32] = bytes(rng.randrange(256) & (0x7f if i % 2 else 0xff) for i in range(512))
+        offset += 16 * 32
+        metatiles_offset = offset
+        rom[offset:offset + 0x10] = bytes(0x10)
+        offset += 0x10
+
+        header = TILESET_TABLE_OFFSET + number * TILESET_HEADER_SIZE
+        rom[header:header + TILESET_HEADER_SIZE] = bytes([is_compressed, number >= 2, 0, 0]) + b''.join(
+            (0x8000000 | pointer).to_bytes(4, 'little')
+            for pointer in (image_offset, palettes_offset, metatiles_offset)
+        ) + bytes(8)
+        headers.append(header)
+    with open(filename, 'wb') as f:
+        f.write(rom)
+    return headers
+
+
+@pytest.fixture
+def tileset_rom(tmp_path):
+    filename = str(tmp_path / 'rom.gba')
+    return filename, make_tileset_rom(filename)
@@ -0,0 +1,43 @@
+import struct
+
+import pytest
+
+from jaae import animation_routine
+from jaae.animation import Animation
+from jaae.gba_image import TileSheet
+from jaae.jaae_handler import JaaeHandler, JaaeError
+
+
+def make_animation(start_tile, tile_count, frame_count=2, speed=3):
+    animation = Animation(start_tile, start_tile + tile_count - 1, frame_count, speed)
+    animation.frames = ['frame'] * frame_count
+    return animation
+
+
+def build_entry(animation):
+    frames = {'frame': TileSheet(bytes(32))}
+    routine = animation_routine.build_routine([animation], frames, 'BPEE', True, 0x800000)
+    return struct.unpack_from('<I', routine, animation_routine.ROUTINE_SIZE + 4)[0]
+
+
+def test_largest_fields_fit():
+    entry = build_entry(make_animation(1, 4095, frame_count=32, speed=7))
+    assert entry == 31 | (7 << 5) | (1 << 8) | (4095 << 20)
+    entry = build_entry(make_animation(4095, 1))
+    assert (entry >> 8) & 0xfff == 4095
+
+
+@pytest.mark.parametrize('animation', [
+    make_animation(0, 4096),
+    make_animation(4096, 1),
+    make_animation(0, 1, speed=8),
+    make_animation(0, 1, frame_count=64),
+    make_animation(10, -1),
+])
+def test_overflowing_fields_are_rejected(animation):
+    with pytest.raises(animation_routine.InvalidAnimation):
+        build_entry(animation)
+
+    handler = JaaeHandler()
+    with pytest.raises(JaaeError):
+        handler.check_animation_frames([animation], {'frame': TileSheet(bytes(32))})
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from jaae.build_cache import BuildCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BuildCache(str(tmp_path / 'build_cache'), 100)
+
+
+def set_mtime(cache, key, mtime):
+    os.utime(cache.get_filename(key), (mtime, mtime))
+
+
+def test_key_stability():
+    key = BuildCache.get_key('routine.s', b'\x01\x02', 'EMERALD')
+    assert key == BuildCache.get_key('routine.s', b'\x01\x02', 'EMERALD')
+    # Strings hash the same as their UTF-8 bytes
+    assert key == BuildCache.get_key(b'routine.s', b'\x01\x02', b'EMERALD')
+    # The same in every session, so entries from an earlier one are found
+    assert key == '900d19cfb1a6ddaae9eb05c8d94ac77f26fe34ac'
+    assert key != BuildCache.get_key('routine.s', b'\x01\x03', 'EMERALD')
+    assert key != BuildCache.get_key('routine.s', b'\x01\x02')
+    assert key != BuildCache.get_key(b'\x01\x02', 'routine.s', 'EMERALD')
+    # Where one part ends and the next starts counts
+    assert BuildCache.get_key('ab', 'c') != BuildCache.get_key('a', 'bc')
+    assert BuildCache.get_key('', 'a') != BuildCache.get_key('a', '')
+    assert BuildCache.get_key('é') == BuildCache.get_key('é'.encode('utf-8'))
+
+
+def test_round_trip(cache):
+    key = BuildCache.get_key('a')
+    assert cache.get(key) is None
+    cache.put(key, b'\x00\x48\x70\x47')
+    assert cache.get(key) == b'\x00\x48\x70\x47'
+    assert cache.get(BuildCache.get_key('b')) is None
+    cache.put(key, b'\x70\x47')
+    assert cache.get(key) == b'\x70\x47'
+
+
+def test_put_writes_aside(cache, monkeypatch):
+    key = BuildCache.get_key('a')
+    replaced = []
+
+    def replace(src, dst):
+        # The whole build is in the file before it takes the real name
+        with open(src, 'rb') as f:
+            assert f.read() == b'built'
+        assert not os.path.exists(dst)
+        replaced.append((src, dst))
+        real_replace(src, dst)
+
+    real_replace = os.replace
+    monkeypatch.setattr(os, 'replace', replace)
+    cache.put(key, b'built')
+    assert replaced == [(cache.get_filename(key) + '.tmp', cache.get_filename(key))]
+    assert os.listdir(cache.path) == [key + '.bin']
+
+
+def test_failed_write_leaves_no_entry(cache, monkeypatch):
+    key = BuildCache.get_key('a')
+
+    def replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(os, 'replace', replace)
+    # The build goes on without the cache
+    cache.put(key, b'built')
+    assert cache.get(key) is None
+
+
+def test_eviction_by_last_use(cache):
+    keys = [BuildCache.get_key(str(i)) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        cache.put(key, bytes(30))
+        set_mtime(cache, key, 1000 + i)
+    # The oldest one is used again
+    assert cache.get(keys[0]) == bytes(30)
+    # Over max_bytes, the least recently used go until it fits
+    cache.put(keys[3], bytes(30))
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) == bytes(30) for key in (keys[0], keys[2], keys[3]))
+    cache.put(BuildCache.get_key('big'), bytes(80))
+    assert sorted(os.listdir(cache.path)) == [BuildCache.get_key('big') + '.bin']
+
+
+def test_eviction_ignores_other_files(cache):
+    os.makedirs(cache.path)
+    with open(os.path.join(cache.path, 'notes.txt'), 'wb') as f:
+        f.write(bytes(500))
+    key = BuildCache.get_key('a')
+    cache.put(key, bytes(30))
+    assert cache.get(key) == bytes(30)
+    assert os.path.exists(os.path.join(cache.path, 'notes.txt'))
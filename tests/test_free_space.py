@@ -0,0 +1,35 @@
+from jaae.free_space import FREE_SPACE_MARGIN, FreeSpaceIndex, find_free_blocks
+
+
+def test_find_free_blocks():
+    data = b'\0' * 0x10 + b'\xff' * 0x100 + b'\0' + b'\xff' * 0xff + b'\0' + b'\xff' * 0x200
+    assert find_free_blocks(data) == [(0x10, 0x110), (0x211, 0x411)]
+
+
+def test_best_fit_keeps_margin_after_data():
+    index = FreeSpaceIndex([(0x1001, 0x1200)])
+    offset = index.find_best_fit(0x20)
+    assert offset >= 0x1001 + FREE_SPACE_MARGIN
+    assert offset % 4 == 0
+    assert offset == 0x1014
+
+
+def test_best_fit_without_room_for_margin():
+    index = FreeSpaceIndex([(0x1000, 0x1100), (0x2000, 0x2200)])
+    # The first block is big enough only without the margin
+    assert index.find_best_fit(0x100 - FREE_SPACE_MARGIN) == 0x1000 + FREE_SPACE_MARGIN
+    assert index.find_best_fit(0x100) == 0x2000 + FREE_SPACE_MARGIN
+    assert index.find_best_fit(0x200) is None
+
+
+def test_best_fit_at_rom_start():
+    index = FreeSpaceIndex([(0, 0x100)])
+    assert index.find_best_fit(0x100) == 0
+
+
+def test_allocations_are_kept_apart():
+    index = FreeSpaceIndex([(0x1000, 0x2000)])
+    first = index.find_best_fit(0x100)
+    index.allocate(first, 0x100)
+    second = index.find_best_fit(0x100)
+    assert second >= first + 0x100 + FREE_SPACE_MARGIN
@@ -0,0 +1,217 @@
+import math
+import random
+
+import numpy
+import pytest
+from PIL import Image
+
+from jaae import gba_image
+
+
+def reference_4bpp_to_indices(gbadata, tiles_wide):
+    """The loop the NumPy decoder replaced"""
+    tiles_high = math.ceil(len(gbadata) // 32 / tiles_wide)
+    pixels = [0] * (64 * tiles_wide * tiles_high)
+    for i, pixel_pair in enumerate(gbadata):
+        tile_x = (i >> 5) % tiles_wide
+        tile_y = (i >> 5) // tiles_wide
+        index = 64 * tiles_wide * tile_y + 8 * tiles_wide * ((i & 0x1f) >> 2) + 8 * tile_x + (i & 0x3) * 2
+        pixels[index] = pixel_pair & 0xf
+        pixels[index + 1] = pixel_pair >> 4
+    return numpy.array(pixels, dtype=numpy.uint8).reshape(tiles_high * 8, tiles_wide * 8)
+
+
+def reference_img_to_4bpp(img):
+    """The loop the NumPy encoder replaced"""
+    pixels = list(numpy.asarray(img).ravel())
+    w, h = img.size
+    data = bytearray()
+    for tile in range(h // 8 * w // 8):
+        index = 8 * (tile % (w // 8)) + w * 8 * (tile // (w // 8))
+        for j in range(8):
+            for i in range(4):
+                left = pixels[index + 2 * i + j * w]
+                right = pixels[index + 2 * i + j * w + 1]
+                data.append((left & 0xf) | ((right & 0xf) << 4))
+    return bytes(data)
+
+
+def make_indexed_image(indices):
+    h, w = indices.shape
+    img = Image.frombytes('P', (w, h), numpy.ascontiguousarray(indices, dtype=numpy.uint8).tobytes())
+    img.putpalette(gba_image.GRAY_SCALE_PALETTE)
+    return img
+
+
+def random_bytes(size, seed=3):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+def test_known_tile():
+    indices = gba_image.from_4bpp_to_indices(bytes(range(32)), 1)
+    assert indices.shape == (8, 8)
+    # The low nibble is the pixel on the left
+    assert indices[0].tolist() == [0, 0, 1, 0, 2, 0, 3, 0]
+    assert indices[1].tolist() == [4, 0, 5, 0, 6, 0, 7, 0]
+    assert indices[4].tolist() == [0, 1, 1, 1, 2, 1, 3, 1]
+    assert indices[7].tolist() == [0xc, 1, 0xd, 1, 0xe, 1, 0xf, 1]
+
+
+def test_tile_layout():
+    data = bytes([0x11] * 32 + [0x22] * 32 + [0x33] * 32)
+    assert gba_image.from_4bpp_to_indices(data, 3).tolist() == [[1] * 8 + [2] * 8 + [3] * 8] * 8
+    # The last row of tiles is padded with zeros
+    assert gba_image.from_4bpp_to_indices(data, 2).tolist() == \
+        [[1] * 8 + [2] * 8] * 8 + [[3] * 8 + [0] * 8] * 8
+    assert gba_image.from_4bpp_to_indices(data, 1).tolist() == [[1] * 8] * 8 + [[2] * 8] * 8 + [[3] * 8] * 8
+
+
+@pytest.mark.parametrize('tile_count, tiles_wide', [(1, 1), (5, 3), (17, 16), (512, 16), (4, 8)])
+def test_matches_reference(tile_count, tiles_wide):
+    data = random_bytes(tile_count * 32)
+    indices = gba_image.from_4bpp_to_indices(data, tiles_wide)
+    assert indices.dtype == numpy.uint8
+    assert numpy.array_equal(indices, reference_4bpp_to_indices(data, tiles_wide))
+
+
+def test_partial_tile():
+    # The bytes of an unfinished tile go in the first rows of its pixels
+    data = random_bytes(32 + 8)
+    indices = gba_image.from_4bpp_to_indices(data, 2)
+    assert indices.shape == (8, 16)
+    assert numpy.array_equal(indices, reference_4bpp_to_indices(data, 2))
+    assert indices[:2, 8:].any()
+    assert not indices[2:, 8:].any()
+
+
+def test_memoryview_input():
+    data = random_bytes(64)
+    assert numpy.array_equal(
+        gba_image.from_4bpp_to_indices(memoryview(data), 2), gba_image.from_4bpp_to_indices(data, 2)
+    )
+
+
+def test_from_4bpp_to_img():
+    data = random_bytes(6 * 32)
+    img = gba_image.from_4bpp_to_img(data, 4)
+    assert img.mode == 'P'
+    assert img.size == (32, 16)
+    assert numpy.array_equal(numpy.asarray(img), reference_4bpp_to_indices(data, 4))
+    assert img.getpalette()[:16 * 3] == gba_image.GRAY_SCALE_PALETTE
+
+
+def test_encode_known_tile():
+    # Each pixel is its x plus 2 times its y
+    indices = numpy.add.outer(numpy.arange(8) * 2, numpy.arange(8))
+    data = gba_image.from_img_to_4bpp(make_indexed_image(indices))
+    assert data[:4] == bytes([0x10, 0x32, 0x54, 0x76])
+    assert data[4:8] == bytes([0x32, 0x54, 0x76, 0x98])
+    assert len(data) == 32
+
+
+@pytest.mark.parametrize('w, h', [(8, 8), (16, 8), (8, 24), (24, 16), (128, 256)])
+def test_encode_matches_reference(w, h):
+    rng = numpy.random.default_rng(w * h)
+    # Only the low nibble of the indices is kept
+    img = make_indexed_image(rng.integers(0, 256, (h, w)))
+    data = gba_image.from_img_to_4bpp(img)
+    assert data == reference_img_to_4bpp(img)
+    assert numpy.array_equal(gba_image.from_4bpp_to_indices(data, w // 8), numpy.asarray(img) & 0xf)
+
+
+@pytest.mark.parametrize('img', [
+    Image.new('RGB', (8, 8)),
+    Image.new('P', (12, 8)),
+    Image.new('P', (8, 4)),
+])
+def test_encode_invalid_image(img):
+    with pytest.raises(gba_image.ImageFormatError):
+        gba_image.from_img_to_4bpp(img)
+
+
+def reference_gba_to_pal(data):
+    colors = []
+    for i in range(len(data) // 2):
+        n = int.from_bytes(data[i * 2:(i + 1) * 2], 'little')
+        colors.extend(((n & 0x1f) << 3, (n & 0x3e0) >> 2, (n & 0x7c00) >> 7))
+    return colors
+
+
+def test_pal_to_gba():
+    palette = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (8, 16, 24), (7, 7, 7)]
+    assert gba_image.pal_to_gba(palette) == bytes.fromhex('1f00 e003 007c 410c 0000')
+    assert gba_image.palette_to_gba([c for color in palette for c in color] + [0] * 33) == \
+        bytes.fromhex('1f00 e003 007c 410c') + bytes(24)
+
+
+def test_from_gba_to_pal():
+    data = bytes.fromhex('1f00 e003 007c ff7f 410c')
+    assert gba_image.from_gba_to_pal(data) == [248, 0, 0, 0, 248, 0, 0, 0, 248, 248, 248, 248, 8, 16, 24]
+    data = random_bytes(64)
+    assert gba_image.from_gba_to_pal(data) == reference_gba_to_pal(data)
+    # The top bit of a color is ignored both ways
+    assert gba_image.pal_to_gba(numpy.reshape(gba_image.from_gba_to_pal(data), (-1, 3))) == \
+        bytes(numpy.frombuffer(data, dtype='<u2') & 0x7fff)
+
+
+def test_from_gba_to_palettes():
+    data = random_bytes(2 * 32 + 6)
+    palettes = gba_image.from_gba_to_palettes(data)
+    # An unfinished palette at the end is left out
+    assert palettes.shape == (2, 16, 3)
+    assert palettes.ravel().tolist() == reference_gba_to_pal(data[:64])
+
+
+@pytest.fixture
+def lut_cache(monkeypatch):
+    monkeypatch.setattr(gba_image, '_palette_luts', {})
+    return gba_image._palette_luts
+
+
+def test_palette_luts(lut_cache):
+    palette = random_bytes(32)
+    colors = numpy.reshape(reference_gba_to_pal(palette), (16, 3))
+    rgb = gba_image.get_palette_lut(palette)
+    assert rgb.tolist() == colors.tolist()
+    rgba = gba_image.get_palette_lut(palette, 'RGBA')
+    assert rgba[:, :3].tolist() == colors.tolist()
+    assert (rgba[:, 3] == 255).all()
+    argb = gba_image.get_palette_lut(palette, 'ARGB32')
+    assert argb.tolist() == [0xff000000 | r << 16 | g << 8 | b for r, g, b in colors.tolist()]
+    for lut in rgb, rgba, argb:
+        assert not lut.flags.writeable
+    with pytest.raises(ValueError):
+        gba_image.get_palette_lut(palette, 'BGR')
+
+
+def test_palette_luts_are_cached(lut_cache):
+    palette = random_bytes(32)
+    lut = gba_image.get_palette_lut(palette, 'ARGB32')
+    assert gba_image.get_palette_lut(bytearray(palette), 'ARGB32') is lut
+    assert gba_image.get_palette_lut(memoryview(palette), 'ARGB32') is lut
+    assert gba_image.get_palette_lut(palette, 'RGB') is not lut
+    assert set(lut_cache) == {(palette, 'ARGB32'), (palette, 'RGB')}
+
+
+def test_palette_lut_cache_is_bounded(lut_cache, monkeypatch):
+    monkeypatch.setattr(gba_image, 'MAX_CACHED_LUTS', 4)
+    palettes = [random_bytes(32, seed) for seed in range(10)]
+    for palette in palettes:
+        gba_image.get_palette_lut(palette)
+        assert len(lut_cache) <= 4
+    # A palette dropped from the cache is decoded again the same
+    assert gba_image.get_palette_lut(palettes[0]).tolist() == \
+        numpy.reshape(reference_gba_to_pal(palettes[0]), (16, 3)).tolist()
+
+
+def test_split_gba_palettes(lut_cache):
+    data = random_bytes(16 * 32)
+    palettes = gba_image.split_gba_palettes(memoryview(data))
+    assert palettes == [data[i * 32:(i + 1) * 32] for i in range(16)]
+    assert all(type(palette) is bytes for palette in palettes)
+    # Their RGB lookup tables are made along the way
+    assert set(lut_cache) == {(palette, 'RGB') for palette in palettes}
+    for palette in palettes:
+        assert gba_image.get_palette_lut(palette).tolist() == \
+            numpy.reshape(reference_gba_to_pal(palette), (16, 3)).tolist()
@@ -0,0 +1,160 @@
+import pytest
+
+from jaae import animation_routine
+from jaae.animation import Animation
+from jaae.gba_image import TileSheet
+from jaae.jaae_handler import JaaeHandler, JaaeError
+from jaae import jaae_fileformat
+from conftest import ROM_SIZE
+
+CALLBACK_POINTER_OFFSET = 0x14
+
+
+def make_project(seed, frame_count=2):
+    frames = {
+        'frame{0}_{1}'.format(seed, i): TileSheet(bytes((seed + i + j) & 0xff for j in range(32 * 4)))
+        for i in range(frame_count)
+    }
+    animation = Animation(seed, seed + 3, frame_count, 2)
+    animation.frames = list(frames)
+    return [animation], frames
+
+
+@pytest.fixture
+def rom_handler(tileset_rom):
+    filename, headers = tileset_rom
+    handler = JaaeHandler()
+    handler.set_rom_filename(filename)
+    return handler, filename, headers
+
+
+def read_rom(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def check_inserted(rom, report, project):
+    pointer = int.from_bytes(rom[report.header_offset + CALLBACK_POINTER_OFFSET:][:4], 'little')
+    assert pointer == 0x8000001 | report.routine_offset
+    routine = animation_routine.build_routine(*project, 'BPEE', report.is_primary, report.routine_offset)
+    assert rom[report.routine_offset:report.routine_offset + report.size] == routine
+
+
+def test_insert_batch(rom_handler, tmp_path):
+    handler, filename, headers = rom_handler
+    saved = str(tmp_path / 'saved.jaae')
+    jaae_fileformat.save_file(saved, *make_project(9))
+    missing_frame = make_project(3)
+    missing_frame[0][0].frames[1] = 'missing'
+    projects = [
+        (headers[0], make_project(1)),
+        (headers[2], saved),
+        (0x100, make_project(2)),
+        (headers[1], missing_frame),
+        (headers[3], str(tmp_path / 'missing.jaae')),
+    ]
+    original = read_rom(filename)
+    _, reports = handler.insert_batch(projects)
+    rom = read_rom(filename)
+
+    assert [report.inserted() for report in reports] == [True, True, False, False, False]
+    check_inserted(rom, reports[0], projects[0][1])
+    check_inserted(rom, reports[1], jaae_fileformat.read_file(saved))
+    assert reports[0].is_primary and not reports[1].is_primary
+    assert 'no tileset header' in reports[2].error
+    assert 'missing' in reports[3].error
+    assert 'missing.jaae' in reports[4].error
+    # The tilesets that failed are left as they were
+    for header in headers[1], headers[3]:
+        assert rom[header:header + 24] == original[header:header + 24]
+
+
+def test_insert_batch_at_offset(rom_handler):
+    handler, filename, headers = rom_handler
+    projects = [(headers[0], make_project(1)), (headers[1], make_project(2, 3))]
+    _, reports = handler.insert_batch(projects, offset=0x8700000)
+    rom = read_rom(filename)
+    assert reports[0].routine_offset == 0x700000
+    assert reports[1].routine_offset == 0x700000 + -(-reports[0].size // 4) * 4
+    for report, (_, project) in zip(reports, projects):
+        check_inserted(rom, report, project)
+
+
+def test_insert_batch_takes_pointers(rom_handler):
+    handler, filename, headers = rom_handler
+    _, reports = handler.insert_batch([(0x8000000 | headers[0], make_project(1))])
+    assert reports[0].inserted()
+    assert reports[0].header_offset == headers[0]
+    check_inserted(read_rom(filename), reports[0], make_project(1))
+
+
+@pytest.mark.parametrize('get_header_offset', [
+    # Indexing from the end of the ROM would find the real header
+    lambda headers: headers[0] - ROM_SIZE,
+    lambda headers: -24,
+    lambda headers: 0x10000000 | headers[0],
+])
+def test_insert_batch_rejects_invalid_header_offsets(rom_handler, get_header_offset):
+    handler, filename, headers = rom_handler
+    header_offset = get_header_offset(headers)
+    original = read_rom(filename)
+    _, reports = handler.insert_batch([(header_offset, make_project(1))])
+    assert not reports[0].inserted()
+    assert reports[0].error
+    assert read_rom(filename) == original
+
+
+def test_insert_batch_rejects_duplicate_headers(rom_handler):
+    handler, filename, headers = rom_handler
+    _, reports = handler.insert_batch([
+        (headers[0], make_project(1)),
+        (0x8000000 | headers[0], make_project(2)),
+        (headers[1], make_project(3)),
+    ])
+    assert [report.inserted() for report in reports] == [True, False, True]
+    assert 'already' in reports[1].error
+    rom = read_rom(filename)
+    check_inserted(rom, reports[0], make_project(1))
+    check_inserted(rom, reports[2], make_project(3))
+    # Nothing else was written after them
+    end = max(report.routine_offset + report.size for report in (reports[0], reports[2]))
+    assert set(rom[end:end + 0x100]) == {0xff}
+
+
+def test_insert_batch_invalid_project_doesnt_block_duplicate(rom_handler):
+    handler, filename, headers = rom_handler
+    invalid = make_project(1)
+    invalid[0][0].frames[0] = None
+    _, reports = handler.insert_batch([(headers[0], invalid), (headers[0], make_project(2))])
+    assert [report.inserted() for report in reports] == [False, True]
+
+
+def test_insert_batch_all_failing(rom_handler):
+    handler, filename, headers = rom_handler
+    original = read_rom(filename)
+    _, reports = handler.insert_batch([(0x100, make_project(1))])
+    assert not reports[0].inserted()
+    assert read_rom(filename) == original
+
+
+def test_insert_batch_invalid_offset(rom_handler):
+    handler, filename, headers = rom_handler
+    with pytest.raises(JaaeError):
+        handler.insert_batch([(headers[0], make_project(1))], offset=0x8700002)
+
+
+def test_insert_batch_patch(rom_handler, tmp_path):
+    handler, filename, headers = rom_handler
+    original = read_rom(filename)
+    patch_filename = str(tmp_path / 'batch.ips')
+    output_txt, reports = handler.insert_batch([(headers[0], make_project(1))], patch_filename=patch_filename)
+    assert reports[0].inserted()
+    assert patch_filename in output_txt
+    with open(patch_filename, 'rb') as f:
+        assert f.read(5) == b'PATCH'
+    # The ROM is left as it was
+    assert read_rom(filename) == original
+
+    output_txt, reports = handler.insert_batch([(headers[0], make_project(1))])
+    assert output_txt == ''
+    assert reports[0].inserted()
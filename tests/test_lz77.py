@@ -0,0 +1,174 @@
+import io
+import random
+
+import pytest
+
+from jaae import lz77
+
+
+def make_samples():
+    rng = random.Random(1)
+    tiles = bytearray()
+    while len(tiles) < 0x4000:
+        tiles += bytes([rng.randrange(16) * 0x11]) * rng.randrange(1, 40)
+    # Repeats further apart than the window
+    far = bytes(rng.randrange(256) for _ in range(0x20)) + bytes(rng.randrange(256) for _ in range(0x1100))
+    far += far[:0x20]
+    return {
+        'empty': b'',
+        'one byte': b'a',
+        'run': b'\x00' * 1000,
+        'short run': b'ab' * 3,
+        'random': bytes(rng.randrange(256) for _ in range(3000)),
+        'text': b'the quick brown fox jumps over the lazy dog. ' * 40,
+        'tiles': bytes(tiles[:0x4000]),
+        'far': far,
+    }
+
+
+SAMPLES = make_samples()
+
+
+def reference_decompress(compressed):
+    """Decodes a byte at a time, the way the BIOS does"""
+    assert compressed[0] == 0x10
+    size = int.from_bytes(compressed[1:4], 'little')
+    out = bytearray()
+    position = 4
+    while len(out) < size:
+        flags = compressed[position]
+        position += 1
+        for bit in range(7, -1, -1):
+            if len(out) >= size:
+                break
+            if flags >> bit & 1:
+                length = (compressed[position] >> 4) + 3
+                displacement = ((compressed[position] & 0xf) << 8 | compressed[position + 1]) + 1
+                position += 2
+                for _ in range(length):
+                    out.append(out[-displacement])
+            else:
+                out.append(compressed[position])
+                position += 1
+    return bytes(out[:size])
+
+
+def get_displacements(compressed):
+    size = int.from_bytes(compressed[1:4], 'little')
+    produced = 0
+    position = 4
+    displacements = []
+    while produced < size:
+        flags = compressed[position]
+        position += 1
+        for bit in range(7, -1, -1):
+            if produced >= size:
+                break
+            if flags >> bit & 1:
+                produced += (compressed[position] >> 4) + 3
+                displacements.append(((compressed[position] & 0xf) << 8 | compressed[position + 1]) + 1)
+                position += 2
+            else:
+                produced += 1
+                position += 1
+    return displacements
+
+
+@pytest.mark.parametrize('level', sorted(lz77.COMPRESSION_LEVELS))
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_round_trip(name, level):
+    data = SAMPLES[name]
+    compressed = lz77.compress(data, level)
+    assert len(compressed) % 4 == 0
+    decompressed, compressed_size = lz77.decompress(compressed)
+    assert bytes(decompressed) == data
+    assert compressed_size <= len(compressed)
+    assert reference_decompress(compressed) == data
+
+
+@pytest.mark.parametrize('level', sorted(lz77.COMPRESSION_LEVELS))
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_no_displacement_below_minimum(name, level):
+    displacements = get_displacements(lz77.compress(SAMPLES[name], level))
+    assert all(lz77.MIN_DISPLACEMENT <= d <= lz77.WINDOW_SIZE for d in displacements)
+
+
+def test_levels_compress():
+    for name in 'run', 'text', 'tiles':
+        fast = lz77.compress(SAMPLES[name], 'fast')
+        optimal = lz77.compress(SAMPLES[name], 'optimal')
+        assert len(optimal) <= len(fast) < len(SAMPLES[name])
+    with pytest.raises(ValueError):
+        lz77.compress(b'abc', 'best')
+
+
+def test_known_vectors():
+    # A literal run, then a back-reference that overlaps with itself
+    compressed = b'\x10\x0a\x00\x00' + bytes([0b00100000]) + b'ab' + bytes([(8 - 3) << 4, 2 - 1])
+    assert bytes(lz77.decompress(compressed)[0]) == b'ababababab'
+    assert lz77.decompress(compressed)[1] == len(compressed)
+    assert lz77.compress(b'aaaaaaaa') == b'\x10\x08\x00\x00\x20aa\x30\x01\x00\x00\x00'
+
+
+def get_decoders():
+    def decompress(data):
+        return bytes(lz77.decompress(data)[0])
+
+    def stream(data):
+        return b''.join(lz77.StreamDecompressor(data, chunk_size=16))
+
+    def validate(data):
+        return lz77.validate(data)
+
+    return [decompress, stream, validate]
+
+
+@pytest.mark.parametrize('decode', get_decoders(), ids=['decompress', 'stream', 'validate'])
+def test_truncated_data(decode):
+    compressed = lz77.compress(SAMPLES['text'])
+    _, compressed_size = lz77.decompress(compressed)
+    for end in range(0, compressed_size, 7):
+        with pytest.raises(lz77.InvalidLz77Data):
+            decode(compressed[:end])
+
+
+@pytest.mark.parametrize('decode', get_decoders(), ids=['decompress', 'stream', 'validate'])
+@pytest.mark.parametrize('compressed', [
+    # A back-reference as the first block
+    b'\x10\x08\x00\x00\x80\x00\x00',
+    # A back-reference further than the output so far
+    b'\x10\x08\x00\x00\x40a\x00\x01',
+    # Not lz77 at all
+    b'\x11\x08\x00\x00\x00abcdefgh',
+])
+def test_invalid_data(decode, compressed):
+    with pytest.raises(lz77.InvalidLz77Data):
+        decode(compressed)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, lz77.CHUNK_SIZE])
+@pytest.mark.parametrize('name', ['random', 'text', 'tiles', 'far'])
+def test_stream_matches_decompress(name, chunk_size, monkeypatch):
+    compressed = lz77.compress(SAMPLES[name]) + b'trailing data'
+    expected, compressed_size = lz77.decompress(compressed)
+    for source in compressed, memoryview(compressed), io.BytesIO(compressed):
+        decompressor = lz77.StreamDecompressor(source, chunk_size=chunk_size)
+        assert b''.join(decompressor) == bytes(expected)
+        assert decompressor.compressed_size == compressed_size
+        assert decompressor.decompressed_size == len(expected)
+    # Files read in blocks that split the flag groups
+    monkeypatch.setattr(lz77, 'READ_SIZE', 5)
+    decompressor = lz77.StreamDecompressor(io.BytesIO(compressed), chunk_size=chunk_size)
+    assert b''.join(decompressor) == bytes(expected)
+    assert decompressor.compressed_size == compressed_size
+
+
+@pytest.mark.parametrize('length', [0, 1, 100, 0x1000, 0x10000])
+def test_decompress_head(length):
+    compressed = lz77.compress(SAMPLES['tiles'])
+    assert lz77.decompress_head(compressed, length) == SAMPLES['tiles'][:length]
+
+
+def test_validate():
+    compressed = lz77.compress(SAMPLES['tiles'])
+    assert lz77.validate(compressed + b'\xff' * 10) == (lz77.decompress(compressed)[1], 0x4000)
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from jaae import lz77
+from jaae import lz77_scanner
+
+ROM_SIZE = 0x10000
+
+
+def make_tiles(size, seed):
+    rng = random.Random(seed)
+    data = bytearray()
+    while len(data) < size:
+        data += bytes([rng.randrange(16) * 0x11]) * rng.randrange(1, 40)
+    return bytes(data[:size])
+
+
+def make_literal_stream(data):
+    """lz77 data made only of raw bytes, so data can be laid out inside it"""
+    stream = bytearray(b'\x10' + len(data).to_bytes(3, 'little'))
+    for i in range(0, len(data), 8):
+        stream += b'\x00' + data[i:i + 8]
+    return bytes(stream)
+
+
+def make_nested_blobs():
+    """
+    Returns lz77 data with another valid lz77 data 8 bytes into its
+    compressed bytes, the kind of lz77-looking bytes the scanner drops
+    """
+    inner_offset = 8
+    inner_size = 4 + 4 * 9
+    # The raw bytes of the outer data go everywhere but its flag bytes,
+    # where the inner data has to have zeros
+    literals = bytearray(64)
+    inner = bytearray(b'\x10\x20\x00\x00')
+    for position in range(inner_offset + 4, inner_offset + inner_size):
+        is_outer_flag = (position - 4) % 9 == 0
+        is_inner_flag = (position - inner_offset - 4) % 9 == 0
+        inner.append(0 if is_outer_flag or is_inner_flag else 0x11)
+    for position, byte in enumerate(inner, inner_offset):
+        if (position - 4) % 9 != 0:
+            literals[(position - 4) // 9 * 8 + (position - 4) % 9 - 1] = byte
+    outer = make_literal_stream(bytes(literals))
+    assert outer[inner_offset:inner_offset + inner_size] == inner
+    assert lz77.decompress(inner)[1] == inner_size
+    return outer, inner_offset
+
+
+@pytest.fixture(scope='module')
+def rom(tmp_path_factory):
+    rom = bytearray(ROM_SIZE)
+    expected = []
+
+    def put(offset, data):
+        rom[offset:offset + len(data)] = data
+        decompressed, compressed_size = lz77.decompress(data)
+        expected.append((offset, compressed_size, len(decompressed)))
+
+    put(0x100, lz77.compress(make_tiles(0x800, 1)))
+    # At the border of two chunks of the scan, and across one
+    put(0x1000, lz77.compress(make_tiles(0x400, 2)))
+    put(0x1ff0, lz77.compress(make_tiles(0x2000, 3)))
+    put(0x6000, lz77.compress(make_tiles(0x20, 4), 'optimal'))
+    outer, inner_offset = make_nested_blobs()
+    put(0x7000, outer)
+    inner_data, inner_compressed_size = lz77.decompress(outer[inner_offset:])
+    nested = (0x7000 + inner_offset, inner_compressed_size, len(inner_data))
+
+    # Headers that look like lz77 but aren't graphics or aren't valid
+    rom[0x8000:0x8008] = b'\x10\x21\x00\x00\x00abc'
+    rom[0x8100:0x8108] = b'\x10\x20\x00\x00\x80\x00\x00\x00'
+    rom[0x8200:0x8208] = b'\x10\x00\x01\x00\x40a\x00\x05'
+    # Valid data that isn't aligned
+    rom[0x9002:0x9002 + 0x100] = lz77.compress(make_tiles(0x200, 5))[:0x100]
+
+    filename = str(tmp_path_factory.mktemp('scanner') / 'rom.gba')
+    with open(filename, 'wb') as f:
+        f.write(rom)
+    return filename, sorted(expected), nested
+
+
+def test_find_candidates():
+    data = bytearray(0x100)
+    data[0x10:0x15] = b'\x10\x40\x00\x00\x00'
+    # Not a multiple of 32, too small, a back-reference first, not aligned
+    data[0x20:0x25] = b'\x10\x41\x00\x00\x00'
+    data[0x30:0x35] = b'\x10\x10\x00\x00\x00'
+    data[0x40:0x45] = b'\x10\x40\x00\x00\x80'
+    data[0x51:0x56] = b'\x10\x40\x00\x00\x00'
+    # More than what's left of the data could expand to
+    data[0xf0:0xf5] = b'\x10\x00\x10\x00\x00'
+    assert lz77_scanner.find_candidates(bytes(data), 0, len(data)) == [0x10]
+    assert lz77_scanner.find_candidates(bytes(data), 0x11, len(data)) == []
+
+
+def test_remove_nested():
+    found = [(0x100, 0x20, 0x40), (0x10, 0x40, 0x80), (0x30, 0x8, 0x20), (0x50, 0x10, 0x20), (0x104, 4, 0x20)]
+    assert lz77_scanner.remove_nested(found) == [(0x10, 0x40, 0x80), (0x50, 0x10, 0x20), (0x100, 0x20, 0x40)]
+    assert lz77_scanner.remove_nested([]) == []
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_scan_rom(rom, processes):
+    filename, expected, nested = rom
+    assert lz77_scanner.scan_rom(filename, processes) == expected
+    assert lz77_scanner.scan_rom(filename, processes, keep_nested=True) == sorted(expected + [nested])
+
+
+def test_scan_rom_sizes(rom):
+    filename, expected, nested = rom
+    assert lz77_scanner.scan_rom(filename, 1, min_size=0x400, max_size=0x800) == \
+        [result for result in expected if 0x400 <= result[2] <= 0x800]
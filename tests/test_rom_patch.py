@@ -0,0 +1,56 @@
+import pytest
+
+from jaae.rom_patch import IPS_EOF_OFFSET, ChangeSet
+
+
+def apply_ips(original, patch):
+    """Applies an IPS patch, failing on anything a strict patcher would reject"""
+    assert patch[:5] == b'PATCH'
+    target = bytearray(original)
+    position = 5
+    while patch[position:position + 3] != b'EOF':
+        assert position + 5 <= len(patch), 'The patch has no footer'
+        offset = int.from_bytes(patch[position:position + 3], 'big')
+        size = int.from_bytes(patch[position + 3:position + 5], 'big')
+        assert offset != IPS_EOF_OFFSET, 'A record starts at the footer offset'
+        position += 5
+        if size == 0:
+            size = int.from_bytes(patch[position:position + 2], 'big')
+            assert size > 0
+            data = patch[position + 2:position + 3] * size
+            position += 3
+        else:
+            data = patch[position:position + size]
+            assert len(data) == size
+            position += size
+        if len(target) < offset + size:
+            target.extend(bytes(offset + size - len(target)))
+        target[offset:offset + size] = data
+    assert position + 3 == len(patch)
+    return bytes(target)
+
+
+def check_ips(changes):
+    target = bytearray(changes.original)
+    changes.apply(target)
+    assert apply_ips(changes.original, changes.make_ips()) == bytes(target)
+
+
+@pytest.mark.parametrize('offset, data', [
+    # A run split in records, the second of which would start at the footer offset
+    (IPS_EOF_OFFSET - 0xffff, b'\x07' * 0x20000),
+    (IPS_EOF_OFFSET - 2 * 0xffff, b'\x07' * 0x30000),
+    (IPS_EOF_OFFSET, b'\x07' * 0x100),
+    (IPS_EOF_OFFSET - 0x10, bytes(range(0x20)) + b'\x07' * 0x100),
+    (IPS_EOF_OFFSET - 0xffff, bytes(range(256)) * 0x200),
+], ids=['rle-split', 'rle-split-twice', 'rle-at-footer', 'plain-then-rle', 'plain-split'])
+def test_ips_records_avoid_footer_offset(offset, data):
+    changes = ChangeSet(bytes(IPS_EOF_OFFSET + 0x20000))
+    changes.write(offset, data)
+    check_ips(changes)
+
+
+def test_ips_grows_rom():
+    changes = ChangeSet(bytes(0x100))
+    changes.write(0xf0, b'\x01' * 0x40)
+    check_ips(changes)
@@ -0,0 +1,53 @@
+import os
+
+from jaae.jaae_handler import JaaeHandler
+
+
+def make_handler(filename):
+    handler = JaaeHandler()
+    handler.set_rom_filename(filename)
+    return handler
+
+
+def test_neighbours_are_prefetched(tileset_rom):
+    filename, headers = tileset_rom
+    handler = make_handler(filename)
+    handler.load_tileset(headers[1])
+    handler.prefetch_executor.submit(lambda: None).result()
+    identity = handler.get_rom().get_identity()
+    assert (identity, headers[0]) in handler.tileset_cache
+    assert (identity, headers[2]) in handler.tileset_cache
+    assert handler.read_cached_tileset(handler.get_rom(), headers[2])[0].data == \
+        handler.read_tileset(handler.get_rom(), headers[2])[0].data
+
+
+def test_prefetch_of_remapped_rom_is_dropped(tileset_rom):
+    filename, headers = tileset_rom
+    handler = make_handler(filename)
+    contents = handler.get_rom()
+    key = (contents.get_identity(), headers[0])
+    # The file changes before the prefetch runs
+    os.utime(filename, ns=(0, 0))
+    assert contents.refresh()
+    handler.prefetch_tileset(contents, key, headers[0])
+    assert key not in handler.tileset_cache
+
+
+def test_prefetch_while_remapping(tileset_rom):
+    filename, headers = tileset_rom
+    handler = make_handler(filename)
+    contents = handler.get_rom()
+    futures = []
+    for i in range(50):
+        key = (contents.get_identity(), headers[i % len(headers)])
+        futures.append(handler.prefetch_executor.submit(
+            handler.prefetch_tileset, contents, key, headers[i % len(headers)]
+        ))
+        # What reopening the ROM or noticing a change on disk does
+        contents.close()
+        contents.refresh()
+    for future in futures:
+        # Nothing went wrong in the prefetch thread
+        future.result()
+    for (identity, offset), tileset in handler.tileset_cache.items():
+        assert tileset[0].data == handler.read_tileset(contents, offset)[0].data
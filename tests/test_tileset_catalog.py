@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from jaae import rom_image
+from jaae import tileset_catalog
+from conftest import TILESET_TABLE_OFFSET, make_tileset_rom
+
+
+def get_fields(catalog):
+    return [
+        (info.number, info.header_offset, info.is_compressed, info.is_primary, info.tile_count,
+         info.thumbnail_data, info.palettes_data)
+        for info in catalog
+    ]
+
+
+def test_build_catalog(tileset_rom):
+    filename, headers = tileset_rom
+    catalog = tileset_catalog.build_catalog(filename, TILESET_TABLE_OFFSET, 0x14, processes=1)
+    assert [info.header_offset for info in catalog] == headers
+    assert [info.is_primary for info in catalog] == [True, True, False, False]
+    assert [info.is_compressed for info in catalog] == [True, True, False, True]
+    assert all(info.tile_count == 512 for info in catalog)
+    assert all(len(info.thumbnail_data) == tileset_catalog.THUMBNAIL_TILES * 32 for info in catalog)
+
+
+def test_build_catalog_in_processes(tmp_path):
+    filename = str(tmp_path / 'rom.gba')
+    make_tileset_rom(filename, 2 * tileset_catalog.MIN_TASKS_PER_PROCESS)
+    serial = tileset_catalog.build_catalog(filename, TILESET_TABLE_OFFSET, 0x14, processes=1)
+    parallel = tileset_catalog.build_catalog(filename, TILESET_TABLE_OFFSET, 0x14, processes=2)
+    assert get_fields(parallel) == get_fields(serial)
+    assert multiprocessing.active_children() == []
+
+
+def test_broken_pool_is_shut_down(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'rom.gba')
+    make_tileset_rom(filename, 2 * tileset_catalog.MIN_TASKS_PER_PROCESS)
+    # The workers fail to map the ROM
+    missing = str(tmp_path / 'missing.gba')
+    monkeypatch.setattr(
+        tileset_catalog, 'make_rom_pool',
+        lambda filename, processes: rom_image.make_rom_pool(missing, processes)
+    )
+    with pytest.raises(BrokenProcessPool):
+        tileset_catalog.build_catalog(filename, TILESET_TABLE_OFFSET, 0x14, processes=2)
+    assert multiprocessing.active_children() == []
+
+
+@pytest.fixture(scope='module')
+def qt_app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.mark.parametrize('exception', [BrokenProcessPool(), RuntimeError('pickling failed'), OSError('gone')])
+def test_dialog_rejects_on_failure(qt_app, exception):
+    # The dialogs are imported through the main window, like the app does
+    from jaae import main_window  # noqa: F401
+    from jaae.jaae_handler import JaaeHandler
+    from jaae.tileset_catalog_dialog import TilesetCatalogDialog
+
+    future = Future()
+    handler = JaaeHandler()
+    handler.start_tileset_catalog = lambda: future
+    dialog = TilesetCatalogDialog(handler)
+    messages = []
+    dialog.error_message = messages.append
+    rejected = []
+    dialog.rejected.connect(lambda: rejected.append(True))
+    assert dialog.start_loading_catalog()
+    future.set_exception(exception)
+    dialog.check_catalog()
+    assert len(messages) == 1
+    assert rejected == [True]
+    assert not dialog.catalog_timer.isActive()
+    assert dialog.catalog == []
+    assert dialog.ui.catalog_lst.count() == 0